@@ -12,14 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import astral
 import time
-import arrow
-from subprocess import call, check_output, CalledProcessError
-from pytz import timezone
-from datetime import datetime
-from collections import namedtuple
-from os.path import join
+_import_start = time.monotonic()
+
+import os
+import threading
+from subprocess import CalledProcessError
+from datetime import date, datetime
+from os.path import exists, join
 
 from mycroft.api import is_paired
 from mycroft.messagebus.message import Message
@@ -29,66 +29,45 @@ from mycroft.util.parse import normalize
 from mycroft.util import play_wav
 from mycroft import intent_file_handler
 
-from PIL import Image, ImageDraw, ImageFont
-from pixel_ring import pixel_ring
-import struct
-
-# Basic drawing to the framebuffer
-Color = namedtuple('Color', ['red', 'green', 'blue'])
-Screen = namedtuple('Screen', ['height', 'width'])
-
-SCREEN = Screen(800, 480)
-BACKGROUND = Color(34, 167, 240)
+from .animation import load_animation
+from .assets import AssetStore
+from .backlight import open_backlight
+from .display import AnimationPlayer, RenderWorker
+from .earcons import EarconPlayer, SOUND_EXT
+from .framebuffer import FrameBuffer, open_framebuffer
+from .leds import (LedRing, PixelRingBackend, NUM_LEDS,
+                   LISTENING, THINKING, SPEAKING, VOLUME)
+from .metrics import METRICS, DUMP_INTERVAL
+from .pulse import PulseControl
+from .solar import AUTO_LEVELS, SolarSchedule
+from .text import TextRenderer
+from .timeline import Step, Timeline
+from .userconfig import ConfigSync
+from .volume import AudioState, open_amp
+
+# arrow, astral, pytz, PIL and pixel_ring are imported where first used,
+# keeping them off the boot path
+IMPORT_TIME = time.monotonic() - _import_start
 
 FONT_PATH = 'NotoSansDisplay-Bold.ttf'
-
-
-def fit_font(text, font_path, font_size):
-    """ Brute force a good fontsize to make text fit screen. """
-    font = ImageFont.truetype(font_path, font_size)
-    w, h = font.getsize(text)
-    while w < 0.9 * SCREEN.width:
-        # iterate until the text size is just larger than the criteria
-        font_size += 1
-        font = ImageFont.truetype(font_path, font_size)
-        w, h = font.getsize(text)
-
-    return font
-
-
-def write_fb(im, dev='/dev/fb0'):
-    """ Write Image Object to framebuffer.
-
-        TODO: Check memory mapping
-    """
-    start_time = time.time()
-    cols = []
-    for j in range(im.size[1] - 1):
-        for i in range(im.size[0]):
-            R, G, B, A = im.getpixel((i, j))
-            # Write color data in the correct order for the screen
-            cols.append(struct.pack('BBBB', B, G, R, A))
-    LOG.info('Row time: {}'.format(time.time() - start_time))
-    with open(dev, 'wb') as f:
-        color = [BACKGROUND.blue, BACKGROUND.green, BACKGROUND.red, 0]
-        f.write(struct.pack('BBBB', *color) *
-                ((SCREEN.height - im.size[1]) // 2  * SCREEN.width))
-        f.write(b''.join(cols))
-        f.write(struct.pack('BBBB', *color) *
-                ((SCREEN.height - im.size[1]) // 2  * SCREEN.width))
-
-    LOG.debug('Draw time: {}'.format(time.time() - start_time))
-
-
-def draw_file(file_path, dev='/dev/fb0'):
-    """ Writes a file directly to the framebuff device.
-    Arguments:
-        file_path (str): path to file to be drawn to frame buffer device
-        dev (str): Optional framebuffer device to write to
-    """
-    with open(file_path, 'rb') as img:
-        with open(dev, 'wb') as fb:
-            fb.write(img.read())
+LOADING_ANIMATION = 'loading.fba'
+# Seconds the loading animation plays at most, in case mycroft.ready
+# never comes
+LOADING_TIMEOUT = 120
+# Seconds after the skills process started in which the skill is loaded
+# at boot; a later load is a reload on a running device, mycroft.ready was
+# already sent
+BOOT_WINDOW = 120
+EARCONS = ('bootup',)
+SCREENS = ('0-wifi-connect', '1-wifi-follow-prompt', '2-wifi-choose-network',
+           '3-wifi-success', '4-pairing-home', '5-pairing-success',
+           '6-intro', 'mycroft')
+
+AUTO_BRIGHTNESS_EVENT = 'AutoBrightness'
+
+# Screen sequence priorities, a sequence can't interrupt a higher one
+PRIORITY_SETUP = 0
+PRIORITY_READY = 10
 
 
 # Definitions used when sending volume over i2c
@@ -108,12 +87,33 @@ def clip(val, minimum, maximum):
     """
     return min(max(val, minimum), maximum)
 
+
+def process_age():
+    """ Seconds since this process started, None if it can't be read. """
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may contain spaces;
+            # the start time in clock ticks after boot is the 20th
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def timed_handler(func):
+    """ Record the time a bus handler takes as 'handler.<name>'. """
+    return METRICS.timed('handler.' + func.__name__)(func)
+
+
 class Mark2(MycroftSkill):
     """
         The Mark2 skill handles much of the screen and audio activities
         related to Mycroft's core functionality.
     """
     def __init__(self):
+        start = time.monotonic()
         super().__init__('Mark2')
 
         self.settings['auto_brightness'] = False
@@ -122,29 +122,55 @@ class Mark2(MycroftSkill):
         # System volume
         self.volume = 0.5
         self.muted = False
-        self.get_hardware_volume()       # read from the device
+        # Amp and PulseAudio are kept open for the skill's lifetime
+        self.audio = AudioState(open_amp(), PulseControl())
+        self._volume_changed = False
+        # Read from the device without holding up startup
+        threading.Thread(target=self.get_hardware_volume,
+                         name='Mark2VolumeProbe', daemon=True).start()
 
         # Screen handling
-        self.loading = True
+        self.display = RenderWorker(self._open_framebuffer())
+        self.animation = AnimationPlayer(self.display)
+        self.timeline = Timeline(self.draw_screen)
+        self._text_renderer = None
+        # Only a skill loaded at boot gets mycroft.ready
+        age = process_age()
+        self.loading = age is not None and age < BOOT_WINDOW
         self.last_text = time.monotonic()
         self.skip_list = ('Mark2', 'TimeSkill.update_display')
 
         # LEDs
-        pixel_ring.set_vad_led(False)  # No red center LED speech indication
-        self.main_blue = 0x22A7F0
-        self.tertiary_blue = 0x4DE0FF
-        self.tertiary_green = 0x40DBB0
-        self.num_leds = 12
+        self.leds = LedRing(PixelRingBackend())
         self.show_volume = False
-        self.speaking = False
+
+        # Brightness
+        self.backlight = open_backlight()
+        self.solar = SolarSchedule()
+
+        self.startup_times = {'import': IMPORT_TIME,
+                              '__init__': time.monotonic() - start}
 
     def initialize(self):
         """ Perform initalization.
 
             Registers messagebus handlers.
         """
+        start = time.monotonic()
         self.brightness_dict = self.translate_namedvalues('brightness.levels')
 
+        fb = self.display.fb
+        # Screens not yet preloaded are streamed from disk when drawn and
+        # sounds are decoded on first use
+        self.screens = AssetStore(join(self.root_dir, 'ui'), fb.screen,
+                                  fb.bits_per_pixel)
+        if self.screens.compiled:
+            LOG.info('Using screens compiled for the display in {}'.format(
+                self.screens.compiled))
+        self.earcons = EarconPlayer(join(self.root_dir, 'ui'))
+        threading.Thread(target=self._preload, name='Mark2Preload',
+                         daemon=True).start()
+        self._play_loading()
 
         try:
             # Handle Wi-Fi Setup and Pairing Visuals
@@ -188,33 +214,104 @@ class Mark2(MycroftSkill):
             self.add_event('mycroft.volume.duck', self.on_volume_duck)
             self.add_event('mycroft.volume.unduck', self.on_volume_unduck)
 
+            # Performance snapshot
+            self.add_event('mark2.perf.get', self.handle_perf_get)
+
         except Exception:
             LOG.exception('In Mark 2 Skill')
 
         # Update use of wake-up beep
+        from mycroft.configuration.config import USER_CONFIG, Configuration
+        self.config_sync = ConfigSync(USER_CONFIG, self._announce_config,
+                                      Configuration.get)
         self._sync_wake_beep_setting()
+        self._apply_perf_settings()
 
         self.settings.set_changed_callback(self.on_websettings_changed)
 
+        self.startup_times['initialize'] = time.monotonic() - start
+        LOG.info('Startup: import {:.1f} ms, __init__ {:.1f} ms, '
+                 'initialize {:.1f} ms'.format(
+                     *(1000 * self.startup_times[k]
+                       for k in ('import', '__init__', 'initialize'))))
+
+    def _preload(self):
+        if self.settings.get('preload_screens', True):
+            try:
+                self.screens.preload(SCREENS)
+            except Exception:
+                LOG.exception('Could not preload screens')
+        try:
+            self.earcons.preload(EARCONS)
+        except Exception:
+            LOG.exception('Could not preload sounds')
+
     ###################################################################
     # System events
+    def _open_framebuffer(self):
+        """ Open the framebuffer in the geometry and format it reports. """
+        try:
+            fb = open_framebuffer()
+        except (OSError, ValueError) as e:
+            LOG.warning('Could not detect the framebuffer ({}), assuming '
+                        'the default screen'.format(e))
+            return FrameBuffer()
+        LOG.info('Framebuffer {}x{}, {} bits per pixel, stride {}'.format(
+            fb.screen.width, fb.screen.height, fb.bits_per_pixel, fb.stride))
+        return fb
+
+    @property
+    def text_renderer(self):
+        """ Text renderer for the skill's font, created on first use. """
+        if self._text_renderer is None:
+            font_path = self.find_resource(FONT_PATH, 'ui')
+            fb = self.display.fb
+            self._text_renderer = TextRenderer(
+                font_path, fb.screen, bits_per_pixel=fb.bits_per_pixel)
+        return self._text_renderer
+
+    def draw_screen(self, name):
+        """ Draw one of the full screen images from the ui directory. """
+        self.animation.stop()
+        self.display.submit(lambda fb: self.screens.draw(fb, name))
+
+    def _play_loading(self):
+        """ Loop the loading animation until the device is ready, for
+            LOADING_TIMEOUT seconds at most.
+
+            Only played at boot, not when the skill is reloaded on a
+            running device or a setup or pairing screen is up.
+        """
+        path = join(self.root_dir, 'ui', LOADING_ANIMATION)
+        if not self.loading or self.timeline.active or not exists(path):
+            return
+        try:
+            animation = load_animation(path)
+            loops = max(int(LOADING_TIMEOUT // animation.duration), 1)
+            self.animation.play(animation, loops)
+        except Exception:
+            LOG.exception('Could not play the loading animation')
+
+    @timed_handler
     def handle_show_text(self, message):
         self.log.debug("Drawing text to framebuffer")
-        text = message.data.get('text')
-        if text:
-            text = text.strip()
-            font = fit_font(text, self.find_resource(FONT_PATH, 'ui'), 30)
-            w, h = font.getsize(text)
-            image = Image.new('RGBA', (SCREEN.width, h), BACKGROUND)
-            draw = ImageDraw.Draw(image)
-            # Draw to center of screen
-            draw.text(((SCREEN.width - w) / 2, 0), text,
-                      fill='white', font=font)
-            write_fb(image)
+        text = (message.data.get('text') or '').strip()
+        if not text:
+            return
+        renderer = self.text_renderer
+
+        def draw(fb):
+            fb.draw_band(renderer.render(text))
+            self.log.debug('Text cache: {}, frames: {}'.format(
+                renderer.cache.stats(), self.display.stats()))
+
+        self.animation.stop()
+        self.display.submit(draw)
 
     ###################################################################
     # System volume
 
+    @timed_handler
     def on_volume_set(self, message):
         """ Force vol between 0.0 and 1.0. """
         vol = message.data.get("percent", 0.5)
@@ -222,21 +319,26 @@ class Mark2(MycroftSkill):
 
         self.volume = vol
         self.muted = False
-        self.set_hardware_volume(vol)
+        self._volume_changed = True
+        # Sliders send many values in a row, only write the last one
+        self.set_hardware_volume(vol, coalesce=True)
         self.show_volume = True
 
+    @timed_handler
     def on_volume_get(self, message):
         """ Handle request for current volume. """
         self.bus.emit(message.response(data={'percent': self.volume,
                                              'muted': self.muted}))
         self.show_volume = message.data.get('show', False)
 
+    @timed_handler
     def on_volume_duck(self, message):
         """ Handle ducking event by setting the output to 0. """
         self.muted = True
         self.mute_pulseaudio()
         self.set_hardware_volume(0)
 
+    @timed_handler
     def on_volume_unduck(self, message):
         """ Handle ducking event by setting the output to previous value. """
         self.muted = False
@@ -245,58 +347,92 @@ class Mark2(MycroftSkill):
 
     def mute_pulseaudio(self):
         """Mutes pulseaudio volume"""
-        call(['pacmd', 'set-sink-mute', '0', 'true'])
+        self.audio.set_sink_mute(True)
 
     def unmute_pulseaudio(self):
         """Resets pulseaudio volume to max"""
-        call(['pacmd', 'set-sink-mute', '0', 'false'])
+        self.audio.set_sink_mute(False)
 
-    def set_hardware_volume(self, pct):
+    def set_hardware_volume(self, pct, coalesce=False):
         """ Set the volume on hardware (which supports levels 0-63).
 
             Since the amplifier is quite powerful the range is limited to
-            0 - 30.
+            0 - 30. Nothing is written if the amplifier already has the
+            level.
 
             Arguments:
                 pct (float): audio volume (0.0 - 1.0).
+                coalesce (bool): wait briefly and only write the last of
+                                 several quick changes
         """
         vol = int(VOL_SMAX * pct + VOL_OFFSET) if pct >= 0.01 else VOL_ZERO
         self.log.debug('Setting hardware volume to: {} ({})'.format(pct, vol))
         try:
-            call(['/usr/sbin/i2cset',
-                  '-y',                # force a write
-                  '1',                 # i2c bus number
-                  '0x4b',              # stereo amp device address
-                  str(vol)])           # volume level, 0-30
+            self.audio.set_register(vol, coalesce)
         except Exception as e:
             self.log.error('Couldn\'t set volume. ({})'.format(e))
 
     def get_hardware_volume(self):
-        """ Get the volume from hardware
+        """ Get the volume from hardware, refreshing the cached state
+
+            A volume set through the messagebus while the hardware was
+            being read is kept.
 
             Returns: (float) 0.0 - 1.0 "percentage"
         """
         try:
-            vol = check_output(['/usr/sbin/i2cget', '-y', '1', '0x4b'])
-            # Convert the returned hex value from i2cget
-            hw_vol = int(vol, 16)
-            hw_vol = clip(hw_vol, 0, 63)
-            self.volume = clip((hw_vol - VOL_OFFSET) / VOL_SMAX, 0.0, 1.0)
+            hw_vol = clip(self.audio.sync(), 0, 63)
+            if not self._volume_changed:
+                self.volume = clip((hw_vol - VOL_OFFSET) / VOL_SMAX,
+                                   0.0, 1.0)
         except CalledProcessError as e:
             self.log.info('I2C Communication error:  {}'.format(repr(e)))
         except FileNotFoundError:
             self.log.info('i2cget couldn\'t be found')
-        except Exception:
-            self.log.info('UNEXPECTED VOLUME RESULT:  {}'.format(vol))
+        except OSError as e:
+            self.log.info('I2C Communication error:  {}'.format(repr(e)))
+        except Exception as e:
+            self.log.info('UNEXPECTED VOLUME RESULT:  {}'.format(repr(e)))
 
+    @timed_handler
     def reset_face(self, message):
         """Triggered after skills are initialized."""
         self.loading = False
+        self.animation.stop()
+        # The console and boot splash drew while the device was booting
+        self.display.fb.invalidate()
+        self.log.debug('Loading animation: {}'.format(
+            self.animation.stats()))
         if is_paired():
-            play_wav(join(self.root_dir, 'ui', 'bootup.wav'))
-            draw_file(self.find_resource('mycroft.fb', 'ui'))
+            # Start the splash and the sound together
+            self.timeline.play([Step('mycroft', 0)], PRIORITY_READY)
+            self.play_earcon('bootup')
+
+    def play_earcon(self, name):
+        """ Play a sound from the ui directory without waiting for it.
+
+            The sound is played from memory through the earcon stream,
+            falling back to play_wav() if the stream can't be used or
+            fails while playing.
+
+            Arguments:
+                name (str): file name without extension, e.g. 'bootup'
+        """
+        path = join(self.root_dir, 'ui', name + SOUND_EXT)
+
+        def stream_failed():
+            LOG.warning('Earcon stream failed, using play_wav')
+            play_wav(path)
+
+        try:
+            self.earcons.play(name, stream_failed)
+        except Exception as e:
+            LOG.warning('Earcon stream unavailable ({}), '
+                        'using play_wav'.format(e))
+            play_wav(path)
 
     def shutdown(self):
+        METRICS.stop_dump()
         # Gotta clean up manually since not using add_event()
         self.bus.remove('mycroft.skill.handler.start',
                         self.on_handler_started)
@@ -306,70 +442,95 @@ class Mark2(MycroftSkill):
                         self.on_handler_audio_start)
         self.bus.remove('recognizer_loop:audio_output_end',
                         self.on_handler_audio_end)
-
+        # Parts made in initialize() are missing if it didn't run, and a
+        # part failing to stop must not leave the others running
+        for name, stop in (('timeline', 'shutdown'),
+                           ('animation', 'stop'),
+                           ('display', 'shutdown'),
+                           ('audio', 'close'),
+                           ('earcons', 'close'),
+                           ('config_sync', 'close'),
+                           ('leds', 'shutdown'),
+                           ('backlight', 'shutdown')):
+            part = getattr(self, name, None)
+            if part is None:
+                continue
+            try:
+                getattr(part, stop)()
+            except Exception:
+                LOG.exception('Could not shut down {}'.format(name))
+
+    @timed_handler
     def handle_ap_up(self, message):
-        draw_file(self.find_resource('0-wifi-connect.fb', 'ui'))
+        self.timeline.play([Step('0-wifi-connect', 0)], PRIORITY_SETUP)
 
+    @timed_handler
     def handle_wifi_device_connected(self, message):
-        draw_file(self.find_resource('1-wifi-follow-prompt.fb', 'ui'))
-        time.sleep(8)
-        draw_file(self.find_resource('2-wifi-choose-network.fb', 'ui'))
+        self.timeline.play([Step('1-wifi-follow-prompt', 8),
+                            Step('2-wifi-choose-network', 0)],
+                           PRIORITY_SETUP)
 
+    @timed_handler
     def handle_paired(self, message):
-        draw_file(self.find_resource('5-pairing-success.fb', 'ui'))
-        time.sleep(5)
-        draw_file(self.find_resource('6-intro.fb', 'ui'))
-        time.sleep(15)
-        draw_file(self.find_resource('mycroft.fb', 'ui'))
+        # Done here rather than when the slideshow ends, which another
+        # setup sequence may cancel
+        self._stop_pairing_text()
+        self.timeline.play([Step('5-pairing-success', 5),
+                            Step('6-intro', 15),
+                            Step('mycroft', 0)],
+                           PRIORITY_SETUP)
+
+    def _stop_pairing_text(self):
         if not is_paired():
             self.bus.remove('enclosure.mouth.text', self.handle_show_text)
 
+    @timed_handler
     def on_handler_audio_start(self, message):
         """Light up LED when speaking, show volume if requested"""
         if self.show_volume:
-            pixel_ring.set_volume(int(self.volume * self.num_leds))
+            self.leds.activate(VOLUME, int(self.volume * NUM_LEDS))
         else:
-            self.speaking = True
-            pixel_ring.set_color_palette(self.main_blue, self.tertiary_blue)
-            pixel_ring.speak()
+            self.leds.activate(SPEAKING)
 
+    @timed_handler
     def on_handler_audio_end(self, message):
-        self.speaking = False
-        self.showing_volume = False
-        pixel_ring.off()
+        self.show_volume = False
+        self.leds.deactivate(SPEAKING, VOLUME)
 
+    @timed_handler
     def on_handler_started(self, message):
         """When a skill begins executing turn on the LED ring"""
         handler = message.data.get('handler', '')
         if self._skip_handler(handler):
             return
-        pixel_ring.set_color_palette(self.main_blue, self.tertiary_green)
-        pixel_ring.think()
+        self.leds.activate(THINKING)
 
+    @timed_handler
     def on_handler_complete(self, message):
         """When a skill finishes executing turn off the LED ring"""
         handler = message.data.get('handler', '')
         if self._skip_handler(handler):
             return
 
-        # If speaking has already begun, on_handler_audio_end will
-        # turn off the LEDs
-        if not self.speaking and not self.show_volume:
-            pixel_ring.off()
+        # Speaking and volume take priority, the ring keeps showing them
+        # until on_handler_audio_end
+        self.leds.deactivate(THINKING)
 
     def _skip_handler(self, handler):
         """Ignoring handlers from this skill and from the background clock"""
         return any(skip in handler for skip in self.skip_list)
 
 
+    @timed_handler
     def handle_listener_started(self, message):
         """Light up LED when listening"""
-        pixel_ring.set_color_palette(self.main_blue, self.main_blue)
-        pixel_ring.listen()
+        self.leds.activate(LISTENING)
 
+    @timed_handler
     def handle_listener_ended(self, message):
-        pixel_ring.off()
+        self.leds.deactivate(LISTENING)
 
+    @timed_handler
     def handle_failed_stt(self, message):
         """ No discernable words were transcribed. Show idle screen again. """
         pass
@@ -378,6 +539,7 @@ class Mark2(MycroftSkill):
     #####################################################################
     # Manage network connction feedback
 
+    @timed_handler
     def handle_internet_connected(self, message):
         """ System came online later after booting. """
         if is_paired():
@@ -386,34 +548,84 @@ class Mark2(MycroftSkill):
             # If we are not paired the pairing process will begin.
             # Cannot handle from mycroft.not.paired event because
             # we trigger first pairing with an utterance.
-            draw_file(self.find_resource('3-wifi-success.fb', 'ui'))
-            time.sleep(5)
-            draw_file(self.find_resource('4-pairing-home.fb', 'ui'))
-            self.bus.on('enclosure.mouth.text', self.handle_show_text)
+            # Registered now, not when the slideshow ends: an ap_up from
+            # the phone leaving the access point cancels it
+            self._start_pairing_text()
+            self.timeline.play([Step('3-wifi-success', 5),
+                                Step('4-pairing-home', 0)],
+                               PRIORITY_SETUP)
+
+    def _start_pairing_text(self):
+        # Once, however often the internet connection comes back
+        self.bus.remove('enclosure.mouth.text', self.handle_show_text)
+        self.bus.on('enclosure.mouth.text', self.handle_show_text)
 
     #####################################################################
     # Web settings
 
     def on_websettings_changed(self):
-        """ Update use of wake-up beep. """
+        """ Update use of wake-up beep and performance metrics. """
         self._sync_wake_beep_setting()
+        self._apply_perf_settings()
 
     def _sync_wake_beep_setting(self):
         """ Update "use beep" global config from skill settings. """
-        from mycroft.configuration.config import (
-            LocalConf, USER_CONFIG, Configuration
-        )
-        config = Configuration.get()
         use_beep = self.settings.get('use_listening_beep') is True
-        if not config['confirm_listening'] == use_beep:
-            # Update local (user) configuration setting
-            new_config = {
-                'confirm_listening': use_beep
-            }
-            user_config = LocalConf(USER_CONFIG)
-            user_config.merge(new_config)
-            user_config.store()
-            self.bus.emit(Message('configuration.updated'))
+        self.config_sync.set('confirm_listening', use_beep)
+
+    def _announce_config(self, keys):
+        """ Have services reload the configuration after a write. """
+        self.bus.emit(Message('configuration.updated', {'keys': keys}))
+
+    #####################################################################
+    # Performance metrics
+
+    def _apply_perf_settings(self):
+        """ Turn metrics and the periodic dump on or off.
+
+            Local settings:
+                perf_metrics (bool): record latency histograms
+                perf_dump_path (str): file to write snapshots to
+                perf_dump_interval (float): seconds between snapshots
+        """
+        METRICS.enabled = self.settings.get('perf_metrics') is True
+        path = self.settings.get('perf_dump_path')
+        if METRICS.enabled and path:
+            interval = self.settings.get('perf_dump_interval', DUMP_INTERVAL)
+            METRICS.start_dump(path, interval,
+                               lambda: {'components': self.perf_stats()},
+                               self._on_perf_dump_error)
+        else:
+            METRICS.stop_dump()
+
+    def _on_perf_dump_error(self, e):
+        LOG.warning('Could not write performance metrics ({})'.format(e))
+
+    def perf_stats(self):
+        """ Counters kept by the display, audio, LED and other parts. """
+        stats = {
+            'display': self.display.stats(),
+            'animation': self.animation.stats(),
+            'leds': self.leds.stats(),
+            'audio': self.audio.stats(),
+            'startup_ms': {k: 1000 * v
+                           for k, v in self.startup_times.items()}
+        }
+        if self._text_renderer:
+            stats['text_cache'] = self._text_renderer.cache.stats()
+        if self.backlight:
+            stats['backlight'] = self.backlight.stats()
+        if hasattr(self, 'earcons'):
+            stats['earcons'] = self.earcons.stats()
+        if hasattr(self, 'config_sync'):
+            stats['config_sync'] = self.config_sync.stats()
+        return stats
+
+    def handle_perf_get(self, message):
+        """ Reply with the latency histograms and component counters. """
+        data = METRICS.snapshot()
+        data['components'] = self.perf_stats()
+        self.bus.emit(message.response(data))
 
     #####################################################################
     # Brightness intent interaction
@@ -473,7 +685,10 @@ class Mark2(MycroftSkill):
                 level (int): 0-30, brightness level
                 speak (bool): when True, speak a confirmation
         """
-        # TODO CHANGE THE BRIGHTNESS
+        if self.backlight:
+            self.backlight.set_level(level)
+        else:
+            self.log.info('No backlight to set to level {}'.format(level))
         if speak is True:
             percent = int(float(level) * float(100) / float(30))
             self.speak_dialog(
@@ -488,6 +703,7 @@ class Mark2(MycroftSkill):
             self.handle_auto_brightness(None)
         else:
             self.auto_brightness = False
+            self.cancel_scheduled_event(AUTO_BRIGHTNESS_EVENT)
             self.set_screen_brightness(self.percent_to_level(percent))
 
     @intent_file_handler('brightness.intent')
@@ -502,65 +718,57 @@ class Mark2(MycroftSkill):
         if brightness:
             self._set_brightness(brightness)
 
-    def _get_auto_time(self):
-        """ Get dawn, sunrise, noon, sunset, and dusk time.
+    def _solar_location(self):
+        """ Timezone, latitude and longitude of the device. """
+        return (self.location['timezone']['code'],
+                self.location['coordinate']['latitude'],
+                self.location['coordinate']['longitude'])
 
-            Returns:
-                times (dict): dict with associated (datetime, level)
-        """
-        tz = self.location['timezone']['code']
-        lat = self.location['coordinate']['latitude']
-        lon = self.location['coordinate']['longitude']
-        ast_loc = astral.Location()
-        ast_loc.timezone = tz
-        ast_loc.lattitude = lat
-        ast_loc.longitude = lon
+    def _device_time(self, tz):
+        """ Get a function converting solar times for the scheduler.
 
+            When the device runs in another timezone than the one set by
+            the user, times are shifted by the user's offset and marked UTC.
+        """
+        from pytz import timezone
         user_set_tz = \
             timezone(tz).localize(datetime.now()).strftime('%Z')
-        device_tz = time.tzname
+        if user_set_tz in time.tzname:
+            return lambda d_time: d_time
 
-        if user_set_tz in device_tz:
-            sunrise = ast_loc.sun()['sunrise']
-            noon = ast_loc.sun()['noon']
-            sunset = ast_loc.sun()['sunset']
-        else:
-            secs = int(self.location['timezone']['offset']) / -1000
-            sunrise = arrow.get(
-                ast_loc.sun()['sunrise']).shift(
-                    seconds=secs).replace(tzinfo='UTC').datetime
-            noon = arrow.get(
-                ast_loc.sun()['noon']).shift(
-                    seconds=secs).replace(tzinfo='UTC').datetime
-            sunset = arrow.get(
-                ast_loc.sun()['sunset']).shift(
-                    seconds=secs).replace(tzinfo='UTC').datetime
-
-        return {
-            'Sunrise': (sunrise, 20),  # high
-            'Noon': (noon, 30),        # full
-            'Sunset': (sunset, 5)      # dim
-        }
+        import arrow
+        secs = int(self.location['timezone']['offset']) / -1000
+        return lambda d_time: arrow.get(d_time).shift(
+            seconds=secs).replace(tzinfo='UTC').datetime
 
-    def schedule_brightness(self, time_of_day, pair):
-        """ Schedule auto brightness with the event scheduler.
+    def _get_auto_time(self, day=None):
+        """ Get sunrise, noon, and sunset time.
 
             Arguments:
-                time_of_day (str): Sunrise, Noon, Sunset
-                pair (tuple): (datetime, brightness)
+                day (date): day to get the times for, defaults to today
+
+            Returns:
+                times (dict): dict with associated (datetime, level)
         """
-        d_time = pair[0]
-        brightness = pair[1]
-        now = arrow.now()
-        arw_d_time = arrow.get(d_time)
-        data = (time_of_day, brightness)
-        if now.timestamp > arw_d_time.timestamp:
-            d_time = arrow.get(d_time).shift(hours=+24)
-            self.schedule_event(self._handle_screen_brightness_event, d_time,
-                                data=data, name=time_of_day)
-        else:
-            self.schedule_event(self._handle_screen_brightness_event, d_time,
-                                data=data, name=time_of_day)
+        tz, lat, lon = self._solar_location()
+        sun = self.solar.sun(lat, lon, tz, day or date.today())
+        convert = self._device_time(tz)
+        return {time_of_day: (convert(sun[name]), level)
+                for time_of_day, name, level in AUTO_LEVELS}
+
+    def schedule_brightness(self):
+        """ Schedule the next auto brightness change with the event
+            scheduler, replacing any change already scheduled.
+        """
+        import arrow
+        tz, lat, lon = self._solar_location()
+        time_of_day, d_time, brightness = self.solar.next_transition(
+            lat, lon, tz, arrow.now().datetime)
+        self.cancel_scheduled_event(AUTO_BRIGHTNESS_EVENT)
+        self.schedule_event(self._handle_screen_brightness_event,
+                            self._device_time(tz)(d_time),
+                            data=(time_of_day, brightness),
+                            name=AUTO_BRIGHTNESS_EVENT)
 
     @intent_file_handler('brightness.auto.intent')
     def handle_auto_brightness(self, message):
@@ -569,16 +777,16 @@ class Mark2(MycroftSkill):
             Arguments:
                 message (Message): messagebus message from intent parser
         """
+        import arrow
         self.auto_brightness = True
-        auto_time = self._get_auto_time()
+        now = arrow.now().timestamp
         nearest_time_to_now = (float('inf'), None, None)
-        for time_of_day, pair in auto_time.items():
-            self.schedule_brightness(time_of_day, pair)
-            now = arrow.now().timestamp
+        for time_of_day, pair in self._get_auto_time().items():
             t = arrow.get(pair[0]).timestamp
             if abs(now - t) < nearest_time_to_now[0]:
                 nearest_time_to_now = (abs(now - t), pair[1], time_of_day)
         self.set_screen_brightness(nearest_time_to_now[1], speak=False)
+        self.schedule_brightness()
 
     def _handle_screen_brightness_event(self, message):
         """ Wrapper for setting screen brightness from eventscheduler
@@ -587,12 +795,9 @@ class Mark2(MycroftSkill):
                 message (Message): messagebus message
         """
         if self.auto_brightness is True:
-            time_of_day = message.data[0]
             level = message.data[1]
-            self.cancel_scheduled_event(time_of_day)
             self.set_screen_brightness(level, speak=False)
-            pair = self._get_auto_time()[time_of_day]
-            self.schedule_brightness(time_of_day, pair)
+            self.schedule_brightness()
 
 
 def create_skill():
@@ -0,0 +1,266 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Animations stored as a keyframe and the tiles changed by each frame.
+
+    An animation (.fba) is a header followed by frame records:
+
+        magic     4 bytes  b'MFBA'
+        version   uint8
+        bpp       uint8    bytes per pixel
+        width     uint16
+        height    uint16
+        tile      uint16   tile size in pixels
+        fps       uint16   frames per second
+        frames    uint16   number of frames
+
+    After the header come frames + 1 records, each a uint32 length and a
+    zlib stream. The first record is the raw keyframe (frame 0). Record n
+    holds the tiles of frame n that differ from frame n - 1; the last
+    record holds the tiles going from the last frame back to frame 0, for
+    looping. A tile is its column and row (uint16 each) followed by its
+    pixels row by row, cut at the right and bottom edge of the screen.
+
+    All header fields are little endian.
+"""
+import struct
+import zlib
+
+from .assets import AssetError
+from .framebuffer import SCREEN, BYTES_PER_PIXEL, Screen, convert_bgra
+
+MAGIC = b'MFBA'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHHHHH')
+RECORD = struct.Struct('<I')
+TILE = struct.Struct('<HH')
+ANIMATION_EXT = '.fba'
+TILE_SIZE = 16
+DEFAULT_FPS = 10
+
+
+def tile_rect(screen, tile, column, row):
+    """ Pixel rectangle (left, top, width, height) of a tile. """
+    left, top = column * tile, row * tile
+    return (left, top, min(tile, screen.width - left),
+            min(tile, screen.height - top))
+
+
+def diff_tiles(old, new, screen, tile=TILE_SIZE,
+               bytes_per_pixel=BYTES_PER_PIXEL):
+    """ Encode the tiles of a frame that differ from the previous one.
+
+        Arguments:
+            old (bytes): previous raw frame
+            new (bytes): raw frame
+            screen (Screen): geometry of the frames
+            tile (int): tile size in pixels
+
+        Returns:
+            (bytes): tile records, uncompressed
+    """
+    stride = screen.width * bytes_per_pixel
+    columns = -(-screen.width // tile)
+    records = []
+    for row in range(-(-screen.height // tile)):
+        band = slice(row * tile * stride, (row + 1) * tile * stride)
+        if old[band] == new[band]:
+            continue  # Most of the screen usually doesn't change
+        for column in range(columns):
+            left, top, width, height = tile_rect(screen, tile, column, row)
+            pixels = []
+            changed = False
+            for y in range(top, top + height):
+                offset = y * stride + left * bytes_per_pixel
+                end = offset + width * bytes_per_pixel
+                pixels.append(new[offset:end])
+                changed = changed or old[offset:end] != new[offset:end]
+            if changed:
+                records.append(TILE.pack(column, row))
+                records.extend(pixels)
+    return b''.join(records)
+
+
+def build_animation(frames, screen=SCREEN, fps=DEFAULT_FPS, tile=TILE_SIZE,
+                    level=9):
+    """ Encode raw BGRA32 frames as an animation.
+
+        Arguments:
+            frames (list): raw frames, at least one
+            screen (Screen): geometry of the frames
+            fps (int): frames per second to play at
+            tile (int): tile size in pixels
+            level (int): zlib compression level
+
+        Returns:
+            (bytes): contents of an .fba file
+    """
+    size = screen.width * screen.height * BYTES_PER_PIXEL
+    if not frames:
+        raise AssetError('An animation needs at least one frame')
+    for frame in frames:
+        if len(frame) != size:
+            raise AssetError('Frame is {} bytes, expected {}'.format(
+                len(frame), size))
+    records = [frames[0]]
+    for old, new in zip(frames, frames[1:] + frames[:1]):
+        records.append(diff_tiles(old, new, screen, tile))
+    header = HEADER.pack(MAGIC, VERSION, BYTES_PER_PIXEL, screen.width,
+                         screen.height, tile, fps, len(frames))
+    out = [header]
+    for record in records:
+        packed = zlib.compress(record, level)
+        out.append(RECORD.pack(len(packed)))
+        out.append(packed)
+    return b''.join(out)
+
+
+class Animation:
+    """ An animation read from an .fba file.
+
+        Records stay compressed until they are played.
+
+        Arguments:
+            data (bytes): contents of the file
+    """
+    def __init__(self, data):
+        try:
+            (magic, version, bpp, width, height, self.tile, self.fps,
+             self.frames) = HEADER.unpack_from(data)
+        except struct.error:
+            raise AssetError('Truncated header')
+        if magic != MAGIC or version != VERSION:
+            raise AssetError('Not an animation (version {})'.format(version))
+        if bpp != BYTES_PER_PIXEL:
+            raise AssetError('Unsupported pixel size {}'.format(bpp))
+        self.screen = Screen(width, height)
+        self._records = []
+        view = memoryview(data)
+        offset = HEADER.size
+        while offset < len(data):
+            length, = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            self._records.append(view[offset:offset + length])
+            offset += length
+        if len(self._records) != self.frames + 1 or offset != len(data):
+            raise AssetError('Expected {} frame records, found {}'.format(
+                self.frames + 1, len(self._records)))
+
+    @property
+    def duration(self):
+        """ Seconds one pass through the frames takes. """
+        return self.frames / self.fps
+
+    def keyframe(self):
+        """ The raw first frame. """
+        return zlib.decompress(self._records[0])
+
+    def delta(self, n):
+        """ Tiles turning frame n - 1 into frame n.
+
+            Arguments:
+                n (int): 1 to frames, frames gives the loop back to frame 0
+
+            Returns:
+                (list): (left, top, width, height, pixels) per tile
+        """
+        data = zlib.decompress(self._records[n])
+        view = memoryview(data)
+        tiles = []
+        offset = 0
+        while offset < len(data):
+            column, row = TILE.unpack_from(data, offset)
+            offset += TILE.size
+            left, top, width, height = tile_rect(self.screen, self.tile,
+                                                 column, row)
+            size = width * height * BYTES_PER_PIXEL
+            tiles.append((left, top, width, height,
+                          view[offset:offset + size]))
+            offset += size
+        return tiles
+
+
+def load_animation(path):
+    """ Read an animation file. """
+    with open(path, 'rb') as f:
+        return Animation(f.read())
+
+
+class Canvas:
+    """ The frame an animation is at, kept in memory.
+
+        Tiles changed since the last flush() are remembered, so frames
+        that were never drawn are still covered by the next draw.
+
+        Arguments:
+            animation (Animation): animation to play, starting at frame 0
+    """
+    def __init__(self, animation):
+        self.animation = animation
+        self.frame = 0
+        self.data = bytearray(animation.keyframe())
+        self.pending = 1  # Frames reached but not drawn yet
+        screen, tile = animation.screen, animation.tile
+        self.dirty = {tile_rect(screen, tile, column, row)[:2]
+                      for row in range(-(-screen.height // tile))
+                      for column in range(-(-screen.width // tile))}
+        self._stride = screen.width * BYTES_PER_PIXEL
+
+    def advance(self):
+        """ Move to the next frame, wrapping around to frame 0.
+
+            Returns:
+                (int): the frame now reached
+        """
+        delta = self.animation.delta(self.frame + 1)
+        self.frame = (self.frame + 1) % self.animation.frames
+        for left, top, width, height, pixels in delta:
+            row_bytes = width * BYTES_PER_PIXEL
+            for y in range(height):
+                offset = (top + y) * self._stride + left * BYTES_PER_PIXEL
+                self.data[offset:offset + row_bytes] = \
+                    pixels[y * row_bytes:(y + 1) * row_bytes]
+            self.dirty.add((left, top))
+        self.pending += 1
+        return self.frame
+
+    def flush(self, fb):
+        """ Draw the tiles changed since the last flush.
+
+            Each band of tiles is written as one rectangle spanning its
+            changed tiles.
+
+            Returns:
+                (int): number of bytes written to the device
+        """
+        tile = self.animation.tile
+        screen = self.animation.screen
+        bands = {}
+        for left, top in self.dirty:
+            span = bands.setdefault(top, [left, left])
+            span[0] = min(span[0], left)
+            span[1] = max(span[1], left)
+        written = 0
+        for top, (first, last) in bands.items():
+            right = min(last + tile, screen.width)
+            height = min(tile, screen.height - top)
+            rows = b''.join(
+                self.data[y * self._stride + first * BYTES_PER_PIXEL:
+                          y * self._stride + right * BYTES_PER_PIXEL]
+                for y in range(top, top + height))
+            written += fb.write_rect(
+                first, top, right - first,
+                convert_bgra(rows, right - first, fb.bits_per_pixel))
+        self.dirty.clear()
+        self.pending = 0
+        return written
@@ -0,0 +1,245 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Compressed framebuffer screens.
+
+    A packed screen (.fbz) is a small header followed by a zlib stream of
+    the raw frame:
+
+        magic     4 bytes  b'MFBZ'
+        version   uint8
+        bpp       uint8    bytes per pixel
+        width     uint16
+        height    uint16
+        size      uint32   length of the raw frame
+        data      zlib stream
+
+    All header fields are little endian.
+
+    Screens compiled for a display other than the default one (see
+    tools.compile_assets) are kept in a subdirectory named after the
+    display, e.g. 480x800-16 for a 480x800 RGB565 panel.
+"""
+import struct
+import zlib
+from os.path import exists, isdir, join
+
+from .framebuffer import SCREEN, BGRA32, BYTES_PER_PIXEL, Screen
+
+MAGIC = b'MFBZ'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHHI')
+PACKED_EXT = '.fbz'
+RAW_EXT = '.fb'
+CHUNK_ROWS = 32
+
+
+class AssetError(Exception):
+    """ Raised when a packed screen can't be read. """
+    pass
+
+
+def target_dir(screen, bits_per_pixel):
+    """ Name of the directory holding screens compiled for a display. """
+    return '{}x{}-{}'.format(screen.width, screen.height, bits_per_pixel)
+
+
+def pack_frame(data, screen=SCREEN, bytes_per_pixel=BYTES_PER_PIXEL,
+               level=9):
+    """ Compress a raw frame into the packed format.
+
+        Arguments:
+            data (bytes): raw frame
+            screen (Screen): geometry of the frame
+            bytes_per_pixel (int): pixel size of the frame
+            level (int): zlib compression level
+
+        Returns:
+            (bytes): packed frame
+    """
+    expected = screen.height * screen.width * bytes_per_pixel
+    if len(data) != expected:
+        raise AssetError('Frame is {} bytes, expected {}'.format(len(data),
+                                                                 expected))
+    header = HEADER.pack(MAGIC, VERSION, bytes_per_pixel, screen.width,
+                         screen.height, len(data))
+    return header + zlib.compress(data, level)
+
+
+def read_header(packed):
+    """ Parse the header of a packed frame.
+
+        Returns:
+            (tuple): (screen, bytes per pixel, raw size)
+    """
+    try:
+        magic, version, bpp, width, height, size = \
+            HEADER.unpack_from(packed)
+    except struct.error:
+        raise AssetError('Truncated header')
+    if magic != MAGIC or version != VERSION:
+        raise AssetError('Not a packed frame (version {})'.format(version))
+    return Screen(width, height), bpp, size
+
+
+def unpack_frame(packed):
+    """ Decompress a packed frame.
+
+        Returns:
+            (bytes): raw frame
+    """
+    _, _, size = read_header(packed)
+    data = zlib.decompress(packed[HEADER.size:])
+    if len(data) != size:
+        raise AssetError('Frame is {} bytes, expected {}'.format(len(data),
+                                                                 size))
+    return data
+
+
+def iter_rows(packed, chunk_rows=CHUNK_ROWS):
+    """ Decompress a packed frame a few rows at a time.
+
+        Yields:
+            (int, bytes): first row and the data of the following rows
+    """
+    screen, bpp, size = read_header(packed)
+    stride = screen.width * bpp
+    decompressor = zlib.decompressobj()
+    data = packed[HEADER.size:]
+    done = 0
+    while True:
+        # Limit the output so no more than chunk_rows are held at a time
+        rows = decompressor.decompress(data, stride * chunk_rows)
+        data = decompressor.unconsumed_tail
+        if not rows:
+            break
+        yield done // stride, rows
+        done += len(rows)
+    if done != size:
+        raise AssetError('Frame is {} bytes, expected {}'.format(done, size))
+
+
+class AssetStore:
+    """ Screens stored in a directory, packed or raw.
+
+        For each name a packed (.fbz) file is preferred over a raw (.fb)
+        one. Packed screens can be preloaded to keep them decompressed in
+        memory.
+
+        When the display is given, screens compiled for it are used
+        before the default ones, which are BGRA32 frames of the default
+        screen.
+
+        Arguments:
+            directory (str): directory holding the screens
+            screen (Screen): geometry of the display
+            bits_per_pixel (int): pixel format of the display
+    """
+    def __init__(self, directory, screen=None, bits_per_pixel=None):
+        self.directory = directory
+        self.compiled = None
+        if screen is not None:
+            compiled = join(directory, target_dir(screen, bits_per_pixel))
+            if isdir(compiled):
+                self.compiled = compiled
+        self._frames = {}  # name: (screen, bits per pixel, frame)
+        self._converted = {}  # (name, bits per pixel): preloaded frame
+
+    def path(self, name):
+        """ Path to the file holding a screen, or None. """
+        directories = [self.directory]
+        if self.compiled:
+            directories.insert(0, self.compiled)
+        for directory in directories:
+            for ext in (PACKED_EXT, RAW_EXT):
+                path = join(directory, name + ext)
+                if exists(path):
+                    return path
+        return None
+
+    def preload(self, names):
+        """ Decompress screens into memory ahead of use. """
+        for name in names:
+            self._frames[name] = self._read(name)
+
+    def load(self, name):
+        """ Load the raw frame of a screen.
+
+            Returns:
+                (bytes): raw frame, in the pixel format it is stored in
+        """
+        return self._read(name)[2]
+
+    def _read(self, name):
+        """ Load a screen with the geometry and bits per pixel of its
+            frame. Raw screens are BGRA32 frames of the default screen.
+        """
+        if name in self._frames:
+            return self._frames[name]
+        path = self.path(name)
+        if path is None:
+            raise AssetError('No screen named {}'.format(name))
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not path.endswith(PACKED_EXT):
+            return SCREEN, BGRA32, data
+        screen, bpp, _ = read_header(data)
+        return screen, bpp * 8, unpack_frame(data)
+
+    @staticmethod
+    def _check(name, fb, screen, bits_per_pixel):
+        """ Raise AssetError if a frame can't be drawn on the display. """
+        if screen != fb.screen or bits_per_pixel not in (BGRA32,
+                                                         fb.bits_per_pixel):
+            raise AssetError(
+                '{} is {}x{} at {} bits per pixel, the display is {}x{} at '
+                '{}'.format(name, screen.width, screen.height,
+                            bits_per_pixel, fb.screen.width,
+                            fb.screen.height, fb.bits_per_pixel))
+
+    def draw(self, fb, name):
+        """ Draw a screen to a FrameBuffer.
+
+            Packed screens are decompressed straight into the framebuffer
+            unless they have been preloaded. Screens not compiled for the
+            display are stored as BGRA32 and converted when the display
+            uses another pixel format.
+
+            Arguments:
+                fb (FrameBuffer): framebuffer to draw to
+                name (str): screen name, without extension
+        """
+        if name in self._frames:
+            screen, bits_per_pixel, frame = self._frames[name]
+            self._check(name, fb, screen, bits_per_pixel)
+            if bits_per_pixel == fb.bits_per_pixel:
+                return fb.draw_frame(frame)
+            key = (name, fb.bits_per_pixel)
+            if key not in self._converted:
+                self._converted[key] = fb.from_bgra(frame)
+            return fb.draw_frame(self._converted[key])
+        path = self.path(name)
+        if path is None:
+            raise AssetError('No screen named {}'.format(name))
+        if not path.endswith(PACKED_EXT):
+            self._check(name, fb, SCREEN, BGRA32)
+            return fb.draw_file(path)
+        with open(path, 'rb') as f:
+            packed = f.read()
+        screen, bpp, _ = read_header(packed)
+        self._check(name, fb, screen, bpp * 8)
+        if bpp * 8 == fb.bits_per_pixel:
+            return sum(fb.write_rows(row, data)
+                       for row, data in iter_rows(packed))
+        return sum(fb.write_rows(row, fb.from_bgra(data))
+                   for row, data in iter_rows(packed))
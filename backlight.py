@@ -0,0 +1,150 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Screen backlight control through sysfs. """
+import glob
+import threading
+from os.path import join
+
+from mycroft.util.log import LOG
+
+from .metrics import METRICS
+
+SYSFS_BACKLIGHT = '/sys/class/backlight'
+MAX_LEVEL = 30  # Brightness levels used by the skill, 0-30
+RAMP_TIME = 0.5
+RAMP_INTERVAL = 0.025
+
+
+def find_backlight(sysfs=SYSFS_BACKLIGHT):
+    """ Path of the first backlight device, or None. """
+    devices = sorted(glob.glob(join(sysfs, '*', 'max_brightness')))
+    return devices[0].rsplit('/', 1)[0] if devices else None
+
+
+class Backlight:
+    """ Ramps the backlight between levels on a worker thread.
+
+        A new level replaces the target of a ramp in progress, which then
+        continues from where it is. Writes of the value already set are
+        skipped.
+
+        Arguments:
+            device (str): sysfs directory of the backlight, e.g.
+                          /sys/class/backlight/rpi_backlight
+            ramp_time (float): seconds a full ramp takes
+            interval (float): seconds between steps of a ramp
+    """
+    def __init__(self, device, ramp_time=RAMP_TIME, interval=RAMP_INTERVAL):
+        self.device = device
+        self.ramp_time = ramp_time
+        self.interval = interval
+        self.writes = 0
+        self.requests = 0
+        with open(join(device, 'max_brightness')) as f:
+            self.max_brightness = int(f.read())
+        with open(join(device, 'brightness')) as f:
+            self.current = int(f.read())
+        self.target = self.current
+        self._step = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='Backlight',
+                                        daemon=True)
+        self._thread.start()
+
+    def level_to_brightness(self, level):
+        """ Convert a 0-30 level to the device's brightness scale. """
+        level = min(max(level, 0), MAX_LEVEL)
+        return int(round(level * self.max_brightness / MAX_LEVEL))
+
+    def set_level(self, level, ramp=True):
+        """ Move to a 0-30 brightness level.
+
+            Arguments:
+                level (int): brightness level
+                ramp (bool): ramp smoothly instead of jumping
+        """
+        self.set_brightness(self.level_to_brightness(level), ramp)
+
+    def set_brightness(self, value, ramp=True):
+        """ Move to a raw brightness value. """
+        with self._cond:
+            self.requests += 1
+            self.target = value
+            steps = max(1, int(self.ramp_time / self.interval)) if ramp else 1
+            self._step = max(1, -(-self.max_brightness // steps))
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """ Wait until the target brightness is reached. """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.current == self.target or self._stopped,
+                timeout)
+
+    def stats(self):
+        return {'requests': self.requests, 'writes': self.writes,
+                'brightness': self.current}
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+
+    @METRICS.timed('backlight.write')
+    def _write(self, value):
+        with open(join(self.device, 'brightness'), 'w') as f:
+            f.write(str(value))
+        self.writes += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.current == self.target and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                if self.current < self.target:
+                    value = min(self.current + self._step, self.target)
+                else:
+                    value = max(self.current - self._step, self.target)
+            try:
+                self._write(value)
+            except OSError as e:
+                LOG.error('Couldn\'t set brightness. ({})'.format(e))
+                with self._cond:
+                    self.target = self.current  # Give up on this ramp
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self.current = value
+                self._cond.notify_all()
+                if self.current != self.target:
+                    self._cond.wait(self.interval)
+
+
+def open_backlight(sysfs=SYSFS_BACKLIGHT):
+    """ Open the first backlight found, or None if there is none or it
+        can't be read.
+    """
+    device = find_backlight(sysfs)
+    if device is None:
+        LOG.info('No backlight found in {}'.format(sysfs))
+        return None
+    try:
+        return Backlight(device)
+    except (OSError, ValueError) as e:
+        LOG.warning('Could not open the backlight {} ({})'.format(device, e))
+        return None
@@ -0,0 +1,247 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Single thread owning the framebuffer. """
+import threading
+import time
+
+from mycroft.util.log import LOG
+
+from .animation import Canvas
+from .assets import AssetError
+from .metrics import METRICS
+
+
+class RenderWorker:
+    """ Draws frames on one worker thread, always the most recent one.
+
+        Frames are callables taking the framebuffer. Only one frame waits
+        at a time; submitting a frame while another is waiting drops the
+        waiting one, so a burst of updates only draws the last of them.
+
+        Arguments:
+            fb (FrameBuffer): display to draw to, owned by the worker
+    """
+    def __init__(self, fb):
+        self.fb = fb
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self._cond = threading.Condition()
+        self._slot = None
+        self._busy = False
+        self._thread = None
+        self._stopped = False
+
+    def submit(self, frame):
+        """ Queue a frame, replacing any frame not yet started.
+
+            Arguments:
+                frame (callable): called with the framebuffer to draw
+        """
+        with self._cond:
+            if self._stopped:
+                return
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = (frame, time.monotonic())
+            self.submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='RenderWorker',
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """ Wait until all submitted frames are drawn or dropped.
+
+            Returns:
+                (bool): False if the timeout expired first
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._slot is None and not self._busy, timeout)
+
+    def stats(self):
+        """ Frame counters and latency (submit to drawn) in seconds. """
+        with self._cond:
+            drawn = self.rendered + self.failed
+            return {'submitted': self.submitted,
+                    'rendered': self.rendered,
+                    'dropped': self.dropped,
+                    'failed': self.failed,
+                    'last_latency': self.last_latency,
+                    'max_latency': self.max_latency,
+                    'mean_latency': (self.total_latency / drawn
+                                     if drawn else 0.0)}
+
+    def shutdown(self):
+        """ Drop waiting frames, stop the worker and close the display. """
+        with self._cond:
+            self._stopped = True
+            if self._slot is not None:
+                self.dropped += 1
+                self._slot = None
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        self.fb.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._slot is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                (frame, submitted), self._slot = self._slot, None
+                self._busy = True
+            ok = True
+            try:
+                with METRICS.timer('display.frame'):
+                    frame(self.fb)
+            except Exception:
+                ok = False
+                LOG.exception('Could not draw frame')
+            latency = time.monotonic() - submitted
+            with self._cond:
+                self._busy = False
+                if ok:
+                    self.rendered += 1
+                else:
+                    self.failed += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                self.total_latency += latency
+                self._cond.notify_all()
+
+
+class AnimationPlayer:
+    """ Plays animations through a RenderWorker at their frame rate.
+
+        A player thread moves a Canvas on from frame to frame and submits
+        a draw of the changed tiles for each one. Frames are skipped when
+        drawing falls behind: the player catches up with the schedule and
+        the next draw covers every tile changed since the last one shown.
+
+        Arguments:
+            display (RenderWorker): display to draw on
+    """
+    def __init__(self, display):
+        self.display = display
+        self.advanced = 0
+        self.shown = 0
+        self.skipped = 0
+        self.target_fps = 0
+        self._started = self._last_shown = 0.0
+        self._lock = threading.Lock()
+        self._canvas = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def playing(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self, animation, loops=None, fps=None):
+        """ Start playing an animation, stopping the one playing.
+
+            Arguments:
+                animation (Animation): animation as wide and high as the
+                                       display
+                loops (int): times to play it, None to loop until stopped
+                fps (int): frame rate, the animation's own by default
+        """
+        screen = self.display.fb.screen
+        if animation.screen != screen:
+            raise AssetError('Animation is {}x{}, the display is {}x{}'.format(
+                animation.screen.width, animation.screen.height,
+                screen.width, screen.height))
+        self.stop()
+        canvas = Canvas(animation)
+        with self._lock:
+            self._canvas = canvas
+            self.advanced = 1
+            self.shown = self.skipped = 0
+            self.target_fps = fps or animation.fps
+            self._started = self._last_shown = time.monotonic()
+        self._stop = threading.Event()
+        frames = None if loops is None else loops * animation.frames
+        self._thread = threading.Thread(
+            target=self._run, args=(canvas, frames, self._stop),
+            name='AnimationPlayer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop playing; what is on screen stays there. """
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        with self._lock:
+            self._canvas = None  # Draws still queued become no-ops
+
+    def wait(self, timeout=None):
+        """ Wait for a limited number of loops to finish playing. """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.playing
+
+    def stats(self):
+        """ Frame counters and the frame rate achieved on screen. """
+        with self._lock:
+            elapsed = self._last_shown - self._started
+            return {'frames': self.advanced, 'shown': self.shown,
+                    'skipped': self.skipped,
+                    'target_fps': self.target_fps,
+                    'fps': (self.shown - 1) / elapsed if elapsed else 0.0}
+
+    def _draw(self, canvas, fb):
+        with self._lock:
+            if canvas is not self._canvas or not canvas.pending:
+                return
+            self.shown += 1
+            self.skipped += canvas.pending - 1
+            with METRICS.timer('display.animation_flush'):
+                canvas.flush(fb)
+            self._last_shown = time.monotonic()
+
+    def _run(self, canvas, frames, stop):
+        def draw(fb):
+            self._draw(canvas, fb)
+
+        interval = 1.0 / self.target_fps
+        deadline = time.monotonic()
+        self.display.submit(draw)
+        while frames is None or self.advanced < frames:
+            deadline += interval
+            if stop.wait(max(0.0, deadline - time.monotonic())):
+                return
+            with self._lock:
+                if canvas is not self._canvas:
+                    return
+                canvas.advance()
+                self.advanced += 1
+                # More than a frame behind, skip frames to catch up
+                while (time.monotonic() - deadline >= interval and
+                       (frames is None or self.advanced < frames)):
+                    canvas.advance()
+                    self.advanced += 1
+                    deadline += interval
+            self.display.submit(draw)
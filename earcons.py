@@ -0,0 +1,363 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" UI sounds decoded once and played through long lived output streams.
+"""
+import threading
+import time
+import wave
+from collections import namedtuple
+from os.path import join
+from subprocess import Popen, PIPE, DEVNULL
+
+from mycroft.util.log import LOG
+
+from .assets import AssetError
+from .metrics import METRICS
+
+PcmFormat = namedtuple('PcmFormat', ['rate', 'channels', 'width'])
+Earcon = namedtuple('Earcon', ['name', 'format', 'pcm'])
+
+SOUND_EXT = '.wav'
+# Bytes handed to the stream at a time, so a new sound can cut in
+CHUNK_BYTES = 4096
+LATENCY_MS = 50
+# Seconds without a sound before the output is closed, letting the sound
+# server suspend the device; it is reopened by the next sound
+IDLE_TIMEOUT = 60
+# pacat sample formats by sample width in bytes
+PACAT_FORMATS = {1: 'u8', 2: 's16le', 4: 's32le'}
+
+
+def decode_wav(path, name=None):
+    """ Read a WAV file into memory as raw PCM.
+
+        Arguments:
+            path (str): WAV file
+            name (str): name of the sound, defaults to the path
+
+        Returns:
+            (Earcon): the decoded sound
+    """
+    try:
+        with wave.open(path, 'rb') as f:
+            fmt = PcmFormat(f.getframerate(), f.getnchannels(),
+                            f.getsampwidth())
+            pcm = f.readframes(f.getnframes())
+    except (EOFError, wave.Error) as e:
+        raise AssetError('Could not decode {} ({})'.format(path, e))
+    return Earcon(name or path, fmt, pcm)
+
+
+class Sink:
+    """ Writes sounds to an output on a worker thread.
+
+        Playing a sound replaces the one playing, which stops at the next
+        chunk boundary. An output failing a write is reopened once per
+        sound before the sound is given up. The output is closed after
+        idle_timeout seconds without a sound and reopened by the next one.
+        Subclasses implement _open(), _write() and _close().
+
+        Arguments:
+            fmt (PcmFormat): format of the PCM the sink accepts
+            idle_timeout (float): seconds before closing an idle output,
+                                  None to keep it open
+    """
+    def __init__(self, fmt, idle_timeout=IDLE_TIMEOUT):
+        self.format = fmt
+        self.idle_timeout = idle_timeout
+        self.plays = 0
+        self.interrupted = 0
+        self.failed = 0
+        self.restarts = 0
+        self.idle_closes = 0
+        self.bytes_written = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._cond = threading.Condition()
+        self._next = None
+        self._stopped = False
+        self._thread = None
+        self._output_open = False
+
+    def open(self):
+        """ Open the output now instead of on the first sound.
+
+            Raises:
+                OSError: the output can't be opened
+        """
+        with self._cond:
+            if self._thread is None:
+                self._open_output()
+                self._thread = threading.Thread(
+                    target=self._run, name=type(self).__name__, daemon=True)
+                self._thread.start()
+
+    def play(self, pcm, on_error=None):
+        """ Start playing PCM data, replacing the sound playing.
+
+            Arguments:
+                pcm (bytes): sound in the sink's format
+                on_error (callable): called on the worker thread if the
+                                     sound can't be played
+        """
+        self.open()
+        with self._cond:
+            if self._next is not None:
+                self.interrupted += 1
+            self._next = (pcm, time.monotonic(), on_error)
+            self.plays += 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """ Wait until all sounds have been handed to the output. """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._next is None, timeout)
+
+    def stats(self):
+        """ Sound counters and start latency (play() to first write). """
+        return {'plays': self.plays, 'interrupted': self.interrupted,
+                'failed': self.failed, 'restarts': self.restarts,
+                'idle_closes': self.idle_closes,
+                'bytes': self.bytes_written,
+                'last_latency': self.last_latency,
+                'max_latency': self.max_latency}
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1)
+        self._close_output()
+
+    def _open_output(self):
+        if not self._output_open:
+            self._open()
+            self._output_open = True
+
+    def _close_output(self):
+        if self._output_open:
+            self._output_open = False
+            self._close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                idle = not self._cond.wait_for(
+                    lambda: self._next is not None or self._stopped,
+                    self.idle_timeout if self._output_open else None)
+                if self._stopped:
+                    return
+                if not idle:
+                    current = self._next
+            if idle:
+                if self._output_open:
+                    LOG.debug('Closing the idle {}'.format(
+                        type(self).__name__))
+                    self.idle_closes += 1
+                    self._close_output()
+                continue
+            pcm, requested, on_error = current
+            try:
+                self._open_output()
+                self._play_pcm(pcm, requested, current)
+            except (OSError, ValueError) as e:
+                LOG.error('Could not play sound ({})'.format(e))
+                self.failed += 1
+                self._close_output()
+                if on_error is not None:
+                    on_error()
+            with self._cond:
+                if self._next is current:
+                    self._next = None
+                    self._cond.notify_all()
+
+    def _play_pcm(self, pcm, requested, current):
+        """ Write a sound chunk by chunk until done or replaced. """
+        view = memoryview(pcm)
+        reopened = False
+        for offset in range(0, len(view), CHUNK_BYTES):
+            chunk = view[offset:offset + CHUNK_BYTES]
+            try:
+                self._write(chunk)
+            except (OSError, ValueError) as e:
+                if reopened:
+                    raise
+                LOG.warning('Sound output failed ({}), reopening '
+                            'it'.format(e))
+                reopened = True
+                self.restarts += 1
+                self._close_output()
+                self._open_output()
+                self._write(chunk)
+            self.bytes_written += min(CHUNK_BYTES, len(view) - offset)
+            if offset == 0:
+                self.last_latency = time.monotonic() - requested
+                METRICS.record('earcon.start', self.last_latency)
+                self.max_latency = max(self.max_latency, self.last_latency)
+            if self._next is not current or self._stopped:
+                break  # Replaced by a newer sound
+
+    def _open(self):
+        pass
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class StreamSink(Sink):
+    """ Plays PCM through a pacat process kept running between sounds.
+
+        The stream to PulseAudio stays open, so a sound only costs writes
+        to a pipe instead of starting a player and decoding a file. pacat
+        is restarted if it dies, see Sink.
+
+        Arguments:
+            fmt (PcmFormat): format of the stream
+            command (list): command reading raw PCM from stdin, pacat with
+                            the stream format by default
+            idle_timeout (float): seconds before closing an idle stream
+    """
+    def __init__(self, fmt, command=None, idle_timeout=IDLE_TIMEOUT):
+        super().__init__(fmt, idle_timeout)
+        self.command = list(command or self.pacat_command(fmt))
+        self._proc = None
+
+    @staticmethod
+    def pacat_command(fmt):
+        return ['pacat', '--playback', '--raw',
+                '--format={}'.format(PACAT_FORMATS[fmt.width]),
+                '--rate={}'.format(fmt.rate),
+                '--channels={}'.format(fmt.channels),
+                '--latency-msec={}'.format(LATENCY_MS),
+                '--client-name=mark-2-earcons']
+
+    def _open(self):
+        self._proc = Popen(self.command, stdin=PIPE, stdout=DEVNULL,
+                           stderr=DEVNULL)
+
+    def _write(self, data):
+        if self._proc.poll() is not None:
+            raise OSError('pacat exited with status {}'.format(
+                self._proc.returncode))
+        self._proc.stdin.write(data)
+        self._proc.stdin.flush()
+
+    def _close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=1)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+
+class FileSink(Sink):
+    """ Appends PCM to a file, standing in for an audio stream.
+
+        Arguments:
+            fmt (PcmFormat): format of the PCM
+            path (str): file to write, '/dev/null' discards the sound
+            idle_timeout (float): seconds before closing an idle file
+    """
+    def __init__(self, fmt, path='/dev/null', idle_timeout=IDLE_TIMEOUT):
+        super().__init__(fmt, idle_timeout)
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+
+    def _write(self, data):
+        self._file.write(data)
+        self._file.flush()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EarconPlayer:
+    """ Decodes sounds from a directory once and plays them from memory.
+
+        One sink is kept open per PCM format.
+
+        Arguments:
+            directory (str): directory holding the WAV files
+            sink_factory (callable): creates the sink for a PcmFormat
+    """
+    def __init__(self, directory, sink_factory=StreamSink):
+        self.directory = directory
+        self.sink_factory = sink_factory
+        self._earcons = {}
+        self._sinks = {}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        """ Get a decoded sound, decoding it on first use.
+
+            Arguments:
+                name (str): file name without extension, e.g. 'bootup'
+        """
+        with self._lock:
+            if name not in self._earcons:
+                path = join(self.directory, name + SOUND_EXT)
+                self._earcons[name] = decode_wav(path, name)
+            return self._earcons[name]
+
+    def sink(self, fmt):
+        """ Get the open sink for a format. """
+        with self._lock:
+            if fmt not in self._sinks:
+                sink = self.sink_factory(fmt)
+                sink.open()
+                self._sinks[fmt] = sink
+            return self._sinks[fmt]
+
+    def preload(self, names):
+        """ Decode sounds and open their streams ahead of use. """
+        for name in names:
+            self.sink(self.load(name).format)
+
+    def play(self, name, on_error=None):
+        """ Start playing a sound, returning without waiting for it.
+
+            Arguments:
+                name (str): file name without extension, e.g. 'bootup'
+                on_error (callable): called if the stream fails to play
+                                     the sound after it was started
+
+            Raises:
+                AssetError: the sound can't be decoded
+                OSError: no output stream can be opened
+        """
+        earcon = self.load(name)
+        self.sink(earcon.format).play(earcon.pcm, on_error)
+
+    def stats(self):
+        with self._lock:
+            return {'{}Hz/{}ch/{}B'.format(*fmt): sink.stats()
+                    for fmt, sink in self._sinks.items()}
+
+    def close(self):
+        with self._lock:
+            sinks, self._sinks = list(self._sinks.values()), {}
+        for sink in sinks:
+            sink.close()
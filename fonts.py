@@ -0,0 +1,119 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Font loading and fitting text to the screen. """
+from functools import lru_cache
+
+from .framebuffer import SCREEN
+
+FONT_CACHE_SIZE = 64
+MAX_FONT_SIZE = 1000
+FIT_RATIO = 0.9
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path, font_size):
+    """ Load a font face, reusing recently loaded (path, size) pairs.
+
+        Arguments:
+            font_path (str): path to a TrueType font
+            font_size (int): size in points
+    """
+    from PIL import ImageFont  # Imported on first use to speed up loading
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def max_font_size(font_path, height):
+    """ Find the largest font size whose line height fits in height.
+
+        Arguments:
+            font_path (str): path to a TrueType font
+            height (int): height available for a line
+
+        Returns:
+            (int): font size, at most MAX_FONT_SIZE
+    """
+    def line_height(size):
+        return sum(load_font(font_path, size).getmetrics())
+
+    # The line height is about proportional to the size
+    size = int(height * MAX_FONT_SIZE / line_height(MAX_FONT_SIZE))
+    size = min(max(size, 1), MAX_FONT_SIZE)
+    while size > 1 and line_height(size) > height:
+        size -= 1
+    while size < MAX_FONT_SIZE and line_height(size + 1) <= height:
+        size += 1
+    return size
+
+
+def fit_font(text, font_path, font_size, width=SCREEN.width,
+             height=SCREEN.height):
+    """ Find the smallest font size making text just wider than 90% of width.
+
+        The size is estimated from the width at font_size and then
+        refined with a few measurements, instead of stepping one point at
+        a time. Narrow text like '.' stops at the largest size whose line
+        still fits in height.
+
+        Arguments:
+            text (str): text to fit
+            font_path (str): path to a TrueType font
+            font_size (int): smallest size to consider
+            width (int): width available for the text
+            height (int): height available for the text
+
+        Returns:
+            (FreeTypeFont): font at the fitted size
+    """
+    target = FIT_RATIO * width
+    max_size = max_font_size(font_path, height)
+    if font_size >= max_size:
+        return load_font(font_path, max_size)
+
+    def text_width(size):
+        left, _, right, _ = load_font(font_path, size).getbbox(text)
+        return right - left
+
+    def fits(size):
+        return text_width(size) >= target
+
+    start_width = text_width(font_size)
+    if start_width >= target:
+        return load_font(font_path, font_size)
+
+    # Text width grows about linearly with the size, so bracket the answer
+    # by galloping out from an estimate and then bisect.
+    # Invariant: fits(low) is False, fits(high) is True
+    guess = font_size * target / max(start_width, 1)
+    guess = min(max(int(guess), font_size + 1), max_size)
+    step = 1
+    if fits(guess):
+        high, low = guess, guess - step
+        while low > font_size and fits(low):
+            high, step = low, step * 2
+            low = max(high - step, font_size)
+    else:
+        low, high = guess, min(guess + step, max_size)
+        while not fits(high):
+            if high >= max_size:
+                return load_font(font_path, max_size)
+            low, step = high, step * 2
+            high = min(low + step, max_size)
+    while high - low > 1:
+        mid = (low + high) // 2
+        if fits(mid):
+            high = mid
+        else:
+            low = mid
+    return load_font(font_path, high)
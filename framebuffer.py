@@ -0,0 +1,526 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Basic drawing to the framebuffer. """
+import errno
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+from os.path import basename, join
+
+from .metrics import METRICS
+
+Color = namedtuple('Color', ['red', 'green', 'blue'])
+Screen = namedtuple('Screen', ['width', 'height'])
+FbInfo = namedtuple('FbInfo', ['screen', 'bits_per_pixel', 'stride'])
+
+# Used when the panel can't be detected, the Mark 2 screen is portrait
+SCREEN = Screen(width=480, height=800)
+BACKGROUND = Color(34, 167, 240)
+
+# Supported pixel formats, by bits per pixel
+BGRA32 = 32
+RGB565 = 16
+FORMATS = (BGRA32, RGB565)
+
+BYTES_PER_PIXEL = 4  # Of BGRA32, the format of the stored screens
+STREAM_ROWS = 32
+SYSFS_GRAPHICS = '/sys/class/graphics'
+
+# Lookup tables splitting 8 bit channels into the two RGB565 bytes
+_RED_HIGH = [v & 0xF8 for v in range(256)]
+_GREEN_HIGH = [v >> 5 for v in range(256)]
+_GREEN_LOW = [(v << 3) & 0xE0 for v in range(256)]
+_BLUE_LOW = [v >> 3 for v in range(256)]
+
+# errno values meaning a kernel side copy isn't supported for the files
+UNSUPPORTED_COPY = (errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF,
+                    errno.EOPNOTSUPP)
+
+
+def encode_pixel(color, alpha=0, bits_per_pixel=BGRA32):
+    """ Encode a single color as a framebuffer pixel.
+
+        Arguments:
+            color (Color): color to encode
+            alpha (int): value for the alpha channel (0-255) of BGRA32
+            bits_per_pixel (int): BGRA32 or RGB565
+    """
+    if bits_per_pixel == RGB565:
+        return struct.pack('<H', (color.red >> 3) << 11 |
+                           (color.green >> 2) << 5 | color.blue >> 3)
+    return struct.pack('BBBB', color.blue, color.green, color.red, alpha)
+
+
+def encode_image(im, bits_per_pixel=BGRA32):
+    """ Convert a PIL image to raw framebuffer data in one pass.
+
+        Arguments:
+            im (Image): image to encode
+            bits_per_pixel (int): BGRA32 or RGB565
+
+        Returns:
+            (bytes): pixel data, one row after another
+    """
+    if bits_per_pixel == RGB565:
+        return _encode_rgb565(im)
+    if im.mode != 'RGBA':
+        im = im.convert('RGBA')
+    return im.tobytes('raw', 'BGRA')
+
+
+def _encode_rgb565(im):
+    """ Pack an image as little endian RGB565 using PIL band operations.
+
+        PIL has no RGB565 packer, so the high and low byte of each pixel
+        are built as separate bands and interleaved by the 'LA' packer.
+    """
+    from PIL import Image, ImageChops
+    red, green, blue = im.convert('RGB').split()
+    high = ImageChops.add(red.point(_RED_HIGH), green.point(_GREEN_HIGH))
+    low = ImageChops.add(green.point(_GREEN_LOW), blue.point(_BLUE_LOW))
+    return Image.merge('LA', (low, high)).tobytes()
+
+
+def convert_bgra(data, width, bits_per_pixel):
+    """ Convert BGRA32 rows, e.g. a stored screen, to another format.
+
+        Arguments:
+            data (bytes-like): BGRA32 rows
+            width (int): pixels per row
+            bits_per_pixel (int): BGRA32 or RGB565
+
+        Returns:
+            (bytes-like): the rows in the requested format
+    """
+    if bits_per_pixel == BGRA32:
+        return data
+    from PIL import Image
+    height = len(data) // (width * BYTES_PER_PIXEL)
+    im = Image.frombuffer('RGBA', (width, height), bytes(data), 'raw',
+                          'BGRA', 0, 1)
+    return encode_image(im, bits_per_pixel)
+
+
+def encode_frame(im, screen=SCREEN, background=BACKGROUND,
+                 bits_per_pixel=BGRA32):
+    """ Encode an image as a full frame, vertically centered.
+
+        Rows above and below the image are filled with the background
+        color. Images taller than the screen are cropped.
+
+        Arguments:
+            im (Image): image as wide as the screen
+            screen (Screen): screen geometry
+            background (Color): color used for the padding rows
+            bits_per_pixel (int): BGRA32 or RGB565
+
+        Returns:
+            (bytes): complete frame ready to be written to the device
+    """
+    height = min(im.size[1], screen.height)
+    if im.size[1] != height:
+        im = im.crop((0, 0, im.size[0], height))
+    top = (screen.height - height) // 2
+    bottom = screen.height - height - top
+    fill = encode_pixel(background, bits_per_pixel=bits_per_pixel)
+    return b''.join((fill * (top * screen.width),
+                     encode_image(im, bits_per_pixel),
+                     fill * (bottom * screen.width)))
+
+
+def read_fb_info(sysfs):
+    """ Read the geometry and pixel format of a framebuffer from sysfs.
+
+        Arguments:
+            sysfs (str): sysfs directory of the device, e.g.
+                         /sys/class/graphics/fb0
+
+        Returns:
+            (FbInfo): visible screen, bits per pixel and bytes per row
+    """
+    def read(name):
+        with open(join(sysfs, name)) as f:
+            return f.read().strip()
+
+    width, height = (int(v) for v in read('virtual_size').split(','))
+    try:
+        # The visible area, e.g. 'U:480x800p-0'; the virtual size can be
+        # larger to allow panning
+        match = re.search(r'(\d+)x(\d+)', read('mode'))
+        if match:
+            width, height = int(match.group(1)), int(match.group(2))
+    except OSError:
+        pass
+    bits_per_pixel = int(read('bits_per_pixel'))
+    try:
+        stride = int(read('stride'))
+    except OSError:
+        stride = width * bits_per_pixel // 8
+    return FbInfo(Screen(width, height), bits_per_pixel, stride)
+
+
+def open_framebuffer(dev='/dev/fb0', sysfs=None):
+    """ Create a FrameBuffer matching what the device reports in sysfs.
+
+        Arguments:
+            dev (str): framebuffer device (or stand-in file)
+            sysfs (str): sysfs directory of the device, by default the one
+                         under /sys/class/graphics named like dev
+
+        Raises:
+            OSError: the sysfs attributes couldn't be read
+            ValueError: the pixel format is not supported
+    """
+    info = read_fb_info(sysfs or join(SYSFS_GRAPHICS, basename(dev)))
+    return FrameBuffer(dev, info.screen, info.bits_per_pixel, info.stride)
+
+
+def _copy_range(method, src, dst, offset, count):
+    """ Copy count bytes at offset from src to dst inside the kernel. """
+    if method == 'copy_file_range':
+        return os.copy_file_range(src, dst, count, offset, offset)
+    return os.sendfile(dst, src, offset, count)
+
+
+class FrameBuffer:
+    """ Memory mapped framebuffer device held open between draws.
+
+        A copy of what is on the screen is kept in memory so each draw only
+        writes the rows that differ from it. It is read from the device
+        when opened and again after invalidate(). A regular file of the
+        frame size can be used in place of the device.
+
+        Drawing methods take rows encoded in the device's pixel format and
+        packed without padding, see encode_image(); padding up to the
+        stride is added when writing. Stored BGRA32 screens are converted
+        by from_bgra().
+
+        Arguments:
+            dev (str): framebuffer device (or stand-in file)
+            screen (Screen): screen geometry
+            bits_per_pixel (int): BGRA32 or RGB565
+            stride (int): bytes per row in the device, including padding
+    """
+    def __init__(self, dev='/dev/fb0', screen=SCREEN,
+                 bits_per_pixel=BGRA32, stride=None):
+        if bits_per_pixel not in FORMATS:
+            raise ValueError('Unsupported framebuffer format: {} bits per '
+                             'pixel'.format(bits_per_pixel))
+        self.dev = dev
+        self.screen = screen
+        self.bits_per_pixel = bits_per_pixel
+        self.row_bytes = screen.width * bits_per_pixel // 8
+        self.stride = stride or self.row_bytes
+        if self.stride < self.row_bytes:
+            raise ValueError('Stride {} is shorter than a row of {} '
+                             'bytes'.format(self.stride, self.row_bytes))
+        self.size = screen.height * self.stride
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+        self._file = None
+        self._map = None
+        self._shadow = None
+        self._stale = False
+        self._fills = {}
+        self._lock = threading.Lock()
+        # Kernel side copy methods not yet found unsupported by the device
+        self.copy_methods = [m for m in ('copy_file_range', 'sendfile')
+                             if hasattr(os, m)]
+        self.copy_stats = {}
+
+    @property
+    def is_open(self):
+        return self._map is not None
+
+    @property
+    def native(self):
+        """ True when stored BGRA32 frames can be copied as they are. """
+        return (self.bits_per_pixel == BGRA32 and
+                self.stride == self.row_bytes)
+
+    def encode_image(self, im):
+        """ Encode an image in the device's pixel format. """
+        return encode_image(im, self.bits_per_pixel)
+
+    def from_bgra(self, data):
+        """ Convert BGRA32 rows to the device's pixel format. """
+        return convert_bgra(data, self.screen.width, self.bits_per_pixel)
+
+    def _pad(self, data):
+        """ Add the padding at the end of each row up to the stride. """
+        if self.stride == self.row_bytes:
+            return data
+        padding = bytes(self.stride - self.row_bytes)
+        view = memoryview(data)
+        return b''.join(bytes(view[n:n + self.row_bytes]) + padding
+                        for n in range(0, len(data), self.row_bytes))
+
+    def open(self):
+        """ Map the device and read back what is currently displayed. """
+        if self.is_open:
+            return
+        f = open(self.dev, 'r+b')
+        try:
+            if os.fstat(f.fileno()).st_size < self.size and \
+                    os.path.isfile(self.dev):
+                f.truncate(self.size)  # Fresh stand-in file
+            self._map = mmap.mmap(f.fileno(), self.size)
+        except Exception:
+            f.close()
+            raise
+        self._file = f
+        self._shadow = bytearray(self._map[:])
+        self._stale = False
+
+    def close(self):
+        """ Unmap and close the device. """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+            self._map = self._file = self._shadow = None
+
+    def invalidate(self):
+        """ Read the screen back into the copy before the next draw.
+
+            The copy goes stale when another writer, e.g. the console or a
+            boot splash, draws to the device, and rows it changed would be
+            skipped as unchanged. Reading the device is slow, so this is
+            only called when another writer may have drawn; it returns at
+            once and can be called from any thread.
+        """
+        self._stale = True
+
+    def _sync(self):
+        """ Read back the screen if invalidated, holding the lock. """
+        if self._stale and self._map is not None:
+            self._shadow[:] = self._map
+            self._stale = False
+
+    @METRICS.timed('fb.write_rows')
+    def write_rows(self, top, data):
+        """ Write whole rows starting at row top, skipping unchanged rows.
+
+            Arguments:
+                top (int): first row to write
+                data (bytes-like): encoded rows, without padding
+
+            Returns:
+                (int): number of bytes written to the device
+        """
+        self.open()
+        rows = len(data) // self.row_bytes
+        data = self._pad(memoryview(data)[:rows * self.row_bytes])
+        start = top * self.stride
+        written = 0
+        with self._lock:
+            self._sync()
+            for first, last in self._dirty_spans(start, data, rows):
+                dst = slice(start + first * self.stride,
+                            start + last * self.stride)
+                src = data[first * self.stride:last * self.stride]
+                self._map[dst] = src
+                self._shadow[dst] = src
+                written += len(src)
+        self.bytes_written += written
+        self.bytes_skipped += rows * self.stride - written
+        return written
+
+    @METRICS.timed('fb.write_rect')
+    def write_rect(self, left, top, width, data):
+        """ Write a rectangle of pixels, skipping unchanged rows.
+
+            Arguments:
+                left (int): first column
+                top (int): first row
+                width (int): width of the rectangle in pixels
+                data (bytes-like): encoded rows of the rectangle
+
+            Returns:
+                (int): number of bytes written to the device
+        """
+        self.open()
+        row_bytes = width * self.bits_per_pixel // 8
+        view = memoryview(data)
+        rows = len(view) // row_bytes
+        start = top * self.stride + left * self.bits_per_pixel // 8
+        written = 0
+        with self._lock:
+            self._sync()
+            for row in range(rows):
+                dst = slice(start + row * self.stride,
+                            start + row * self.stride + row_bytes)
+                src = view[row * row_bytes:(row + 1) * row_bytes]
+                if self._shadow[dst] != src:
+                    self._map[dst] = src
+                    self._shadow[dst] = src
+                    written += row_bytes
+        self.bytes_written += written
+        self.bytes_skipped += rows * row_bytes - written
+        return written
+
+    def _dirty_spans(self, start, data, rows):
+        """ Yield (first, last) row ranges of data that differ on screen. """
+        # Slicing the bytearray copies but compares with memcmp, which is
+        # much faster than comparing memoryviews element by element.
+        view = memoryview(data)
+        end = start + rows * self.stride
+        if self._shadow[start:end] == view[:rows * self.stride]:
+            return  # Nothing changed, skip the row by row comparison
+        first = None
+        for row in range(rows):
+            offset = row * self.stride
+            same = (self._shadow[start + offset:start + offset + self.stride]
+                    == view[offset:offset + self.stride])
+            if not same and first is None:
+                first = row
+            elif same and first is not None:
+                yield first, row
+                first = None
+        if first is not None:
+            yield first, rows
+
+    def fill_rows(self, top, count, color):
+        """ Fill count rows starting at top with a solid color. """
+        if count <= 0:
+            return 0
+        if color not in self._fills:
+            pixel = encode_pixel(color, bits_per_pixel=self.bits_per_pixel)
+            self._fills[color] = pixel * (self.screen.width *
+                                          self.screen.height)
+        return self.write_rows(
+            top, memoryview(self._fills[color])[:count * self.row_bytes])
+
+    def draw_frame(self, data):
+        """ Draw a complete encoded frame. """
+        return self.write_rows(0, data[:self.screen.height * self.row_bytes])
+
+    def draw_band(self, data, background=BACKGROUND):
+        """ Draw encoded full width rows vertically centered on a solid
+            background.
+
+            Only the band and background rows that are not already showing
+            the background color are written.
+
+            Arguments:
+                data (bytes-like): encoded rows as wide as the screen
+                background (Color): color of the rows around the band
+        """
+        height = min(len(data) // self.row_bytes, self.screen.height)
+        top = (self.screen.height - height) // 2
+        bottom = top + height
+        band = memoryview(data)[:height * self.row_bytes]
+        return (self.fill_rows(0, top, background) +
+                self.write_rows(top, band) +
+                self.fill_rows(bottom, self.screen.height - bottom,
+                               background))
+
+    def draw_image(self, im, background=BACKGROUND):
+        """ Draw an image vertically centered on a solid background.
+
+            Arguments:
+                im (Image): image as wide as the screen
+                background (Color): color of the rows around the image
+        """
+        return self.draw_band(self.encode_image(im), background)
+
+    @METRICS.timed('fb.draw_file')
+    def draw_file(self, file_path):
+        """ Draw a raw BGRA32 frame stored in a file.
+
+            The frame is copied by the kernel (copy_file_range or sendfile)
+            when the device supports it and uses the same layout, otherwise
+            it is streamed and converted a few rows at a time. Neither path
+            reads the whole frame into a Python buffer.
+
+            Arguments:
+                file_path (str): path to file to be drawn to the framebuffer
+
+            Returns:
+                (int): number of bytes written to the device
+        """
+        self.open()
+        with open(file_path, 'rb') as img:
+            size = min(os.fstat(img.fileno()).st_size, self.size)
+            start = time.monotonic()
+            with self._lock:
+                method = self._kernel_copy(img, size) if self.native else None
+            if method is None:
+                method = 'stream'
+                written = self._stream_copy(img)
+            else:
+                written = size
+                self.bytes_written += size
+        self._record_copy(method, size, time.monotonic() - start)
+        return written
+
+    def _kernel_copy(self, img, size):
+        """ Copy size bytes from img to the device without leaving the
+            kernel.
+
+            Returns:
+                (str): name of the method used or None if none worked
+        """
+        src = img.fileno()
+        dst = self._file.fileno()
+        for method in list(self.copy_methods):
+            try:
+                # sendfile writes at the current position of the device
+                os.lseek(dst, 0, os.SEEK_SET)
+                done = 0
+                while done < size:
+                    count = _copy_range(method, src, dst, done, size - done)
+                    if count == 0:
+                        break
+                    done += count
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_COPY:
+                    raise
+                self.copy_methods.remove(method)
+                continue
+            # Keep the copy of the screen contents up to date
+            img.seek(0)
+            img.readinto(memoryview(self._shadow)[:size])
+            self._stale = self._stale and size < self.size
+            return method
+        return None
+
+    def _stream_copy(self, img):
+        """ Copy a frame through a small reusable buffer. """
+        img.seek(0)
+        row_bytes = self.screen.width * BYTES_PER_PIXEL
+        buf = bytearray(row_bytes * STREAM_ROWS)
+        view = memoryview(buf)
+        row = written = 0
+        while row < self.screen.height:
+            count = img.readinto(buf)
+            if not count:
+                break
+            written += self.write_rows(row, self.from_bgra(view[:count]))
+            row += count // row_bytes
+        return written
+
+    def _record_copy(self, method, size, seconds):
+        total = self.copy_stats.setdefault(method, [0, 0.0])
+        total[0] += size
+        total[1] += seconds
+
+    def throughput(self, method):
+        """ Average bytes per second drawn with a copy method. """
+        size, seconds = self.copy_stats.get(method, (0, 0.0))
+        return size / seconds if seconds else 0.0
@@ -0,0 +1,170 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Glyphs rasterized once per font face and composed into text. """
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from .fonts import load_font
+
+ATLAS_CACHE_SIZE = 8
+LINE_SPACING = 4  # Pixels between lines, as PIL's multiline_text
+
+# mask is None for glyphs without ink, e.g. space
+Glyph = namedtuple('Glyph', ['mask', 'left', 'top', 'advance'])
+
+
+class GlyphAtlas:
+    """ Cache of rasterized glyphs and kerning for one font face.
+
+        Each character is rendered through FreeType the first time it is
+        used. Text is then laid out from the cached advances and kerning
+        and drawn by blitting the glyph masks.
+
+        Arguments:
+            font (FreeTypeFont): font face at the wanted size
+    """
+    def __init__(self, font):
+        self.font = font
+        self.ascent, self.descent = font.getmetrics()
+        self.line_height = self.ascent + self.descent + LINE_SPACING
+        self._glyphs = {}
+        self._kerning = {}
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def glyph(self, char):
+        """ Get the Glyph for a character, rasterizing it on first use. """
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            glyph = self._glyphs[char] = self._rasterize(char)
+        return glyph
+
+    def _rasterize(self, char):
+        from PIL import Image, ImageDraw
+        left, top, right, bottom = self.font.getbbox(char)
+        advance = self.font.getlength(char)
+        if right <= left or bottom <= top:
+            return Glyph(None, left, top, advance)
+        mask = Image.new('L', (right - left, bottom - top))
+        ImageDraw.Draw(mask).text((-left, -top), char, fill=255,
+                                  font=self.font)
+        return Glyph(mask, left, top, advance)
+
+    def kerning(self, first, second):
+        """ Adjustment of the advance between two characters. """
+        pair = first + second
+        kern = self._kerning.get(pair)
+        if kern is None:
+            kern = self._kerning[pair] = (self.font.getlength(pair) -
+                                          self.glyph(first).advance -
+                                          self.glyph(second).advance)
+        return kern
+
+    def layout(self, text):
+        """ Position the glyphs of a single line.
+
+            Returns:
+                (list, float): (Glyph, pen x) pairs and the total advance
+        """
+        placed = []
+        x = 0.0
+        previous = None
+        for char in text:
+            if previous is not None:
+                x += self.kerning(previous, char)
+            glyph = self.glyph(char)
+            placed.append((glyph, x))
+            x += glyph.advance
+            previous = char
+        return placed, x
+
+    def measure(self, text):
+        """ Width of a line's bounding box, as FreeTypeFont.getbbox().
+
+            The box spans from the pen origin, or the ink left of it
+            (e.g. the tail of a leading 'j'), to the larger of the
+            advance and the ink.
+        """
+        placed, advance = self.layout(text)
+        left, right = 0, int(advance)
+        for glyph, x in placed:
+            if glyph.mask is not None:
+                ink = round(x) + glyph.left
+                left = min(left, ink)
+                right = max(right, ink + glyph.mask.size[0])
+        return right - left
+
+    def wrap(self, text, width):
+        """ Break text into lines no wider than width.
+
+            Lines are broken between words; a word wider than width is
+            broken between characters. Newlines in text are kept, and so
+            is the whitespace of a line that fits; a break drops the
+            whitespace it replaces.
+
+            Returns:
+                (list): lines of text
+        """
+        lines = []
+        for paragraph in text.split('\n'):
+            if self.measure(paragraph) <= width:
+                lines.append(paragraph)
+                continue
+            line = ''
+            for space, word in re.findall(r'(\s*)(\S+)', paragraph):
+                candidate = line + space + word if line else word
+                if self.measure(candidate) <= width:
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                line = ''
+                for char in word:
+                    if line and self.measure(line + char) > width:
+                        lines.append(line)
+                        line = ''
+                    line += char
+            lines.append(line)
+        return lines
+
+    def draw(self, coverage, text, origin):
+        """ Blit the glyphs of a line into an 'L' coverage image.
+
+            Overlapping glyphs keep the highest coverage, like FreeType
+            rendering in PIL.
+
+            Arguments:
+                coverage (Image): 'L' image to draw into
+                text (str): line of text
+                origin (tuple): (x, y) of the line's top left corner
+        """
+        from PIL import ImageChops
+        placed, _ = self.layout(text)
+        for glyph, x in placed:
+            if glyph.mask is None:
+                continue
+            left = origin[0] + round(x) + glyph.left
+            top = origin[1] + glyph.top
+            box = (left, top,
+                   left + glyph.mask.size[0], top + glyph.mask.size[1])
+            under = coverage.crop(box)
+            coverage.paste(ImageChops.lighter(under, glyph.mask), box)
+
+
+@lru_cache(maxsize=ATLAS_CACHE_SIZE)
+def atlas_for(font_path, font_size):
+    """ GlyphAtlas for a (path, size) pair, shared between renders. """
+    return GlyphAtlas(load_font(font_path, font_size))
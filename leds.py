@@ -0,0 +1,234 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" LED ring states and the thread driving the ring. """
+import threading
+import time
+
+from mycroft.util.log import LOG
+
+from .metrics import METRICS
+
+MAIN_BLUE = 0x22A7F0
+TERTIARY_BLUE = 0x4DE0FF
+TERTIARY_GREEN = 0x40DBB0
+NUM_LEDS = 12
+
+# States in order of priority, the highest active state is shown
+IDLE = 'idle'
+THINKING = 'thinking'
+LISTENING = 'listening'
+SPEAKING = 'speaking'
+VOLUME = 'volume'
+PRIORITY = {IDLE: 0, THINKING: 1, LISTENING: 2, SPEAKING: 3, VOLUME: 4}
+
+# Minimum time a state is shown before a lower priority state replaces it
+MIN_DWELL = 0.15
+
+
+class PixelRingBackend:
+    """ Shows states on the ReSpeaker ring through pixel_ring.
+
+        pixel_ring is imported by open(), on the LedRing worker thread, so
+        finding the USB device doesn't delay loading the skill.
+    """
+    def __init__(self):
+        self.ring = None
+
+    def open(self):
+        from pixel_ring import pixel_ring
+        self.ring = pixel_ring
+        self.ring.set_vad_led(False)  # No red center LED speech indication
+
+    def show(self, state, level=None):
+        if state == LISTENING:
+            self.ring.set_color_palette(MAIN_BLUE, MAIN_BLUE)
+            self.ring.listen()
+        elif state == THINKING:
+            self.ring.set_color_palette(MAIN_BLUE, TERTIARY_GREEN)
+            self.ring.think()
+        elif state == SPEAKING:
+            self.ring.set_color_palette(MAIN_BLUE, TERTIARY_BLUE)
+            self.ring.speak()
+        elif state == VOLUME:
+            self.ring.set_volume(level)
+        else:
+            self.ring.off()
+
+
+class MockRing:
+    """ Records the states shown instead of driving hardware.
+
+        Arguments:
+            latency (float): seconds each update takes, to mimic the USB
+                             LED controller
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.shown = []
+
+    def show(self, state, level=None):
+        time.sleep(self.latency)
+        self.shown.append((state, level))
+
+
+class LedRing:
+    """ Tracks which states are active and shows the most important one.
+
+        Handlers only mark states active or inactive; a worker thread
+        does all device I/O. Updates that would not change what is shown
+        are dropped, and a state stays up for at least MIN_DWELL seconds
+        before a lower priority one replaces it, so quick off/on flicker
+        never reaches the device. If the backend can't be opened the
+        states are still tracked but nothing is sent to it.
+
+        Arguments:
+            backend: PixelRingBackend, MockRing or similar
+            dwell (float): minimum time to show a state
+    """
+    def __init__(self, backend, dwell=MIN_DWELL):
+        self.backend = backend
+        self.dwell = dwell
+        self.requests = 0
+        self.updates = 0
+        self.available = True  # False once the backend failed to open
+        self._active = {}  # state: level
+        self._shown = (IDLE, None)
+        self._shown_at = 0.0
+        self._cond = threading.Condition()
+        self._changed = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='LedRing',
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def shown(self):
+        """ The (state, level) currently on the ring. """
+        with self._cond:
+            return self._shown
+
+    @property
+    def desired(self):
+        """ The (state, level) that should be on the ring. """
+        with self._cond:
+            return self._desired()
+
+    def _desired(self):
+        if not self._active:
+            return (IDLE, None)
+        state = max(self._active, key=PRIORITY.get)
+        return (state, self._active[state])
+
+    def activate(self, state, level=None):
+        """ Mark a state active.
+
+            Arguments:
+                state (str): one of THINKING, LISTENING, SPEAKING, VOLUME
+                level (int): number of LEDs lit for VOLUME
+        """
+        with self._cond:
+            self._active[state] = level
+            self._request()
+
+    def deactivate(self, *states):
+        """ Mark states inactive. """
+        with self._cond:
+            for state in states:
+                self._active.pop(state, None)
+            self._request()
+
+    def clear(self):
+        """ Mark all states inactive. """
+        with self._cond:
+            self._active.clear()
+            self._request()
+
+    def _request(self):
+        self.requests += 1
+        self._changed = True
+        self._cond.notify_all()
+
+    @property
+    def suppressed(self):
+        return self.requests - self.updates
+
+    def stats(self):
+        return {'requests': self.requests, 'updates': self.updates,
+                'suppressed': self.suppressed, 'available': self.available}
+
+    def wait_idle(self, timeout=None):
+        """ Wait until the ring shows the desired state. """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (not self._changed and
+                         self._shown == self._desired()) or self._stopped,
+                timeout)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+
+    def _next(self):
+        """ Wait for the next state to show, None when stopping. """
+        with self._cond:
+            while True:
+                while not self._changed and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return None
+                desired = self._desired()
+                if desired == self._shown:
+                    self._changed = False
+                    self._cond.notify_all()
+                    continue
+                remaining = self._shown_at + self.dwell - time.monotonic()
+                if (PRIORITY[desired[0]] < PRIORITY[self._shown[0]] and
+                        remaining > 0):
+                    # Let the current state dwell, it may come back
+                    self._cond.wait(remaining)
+                    continue
+                self._changed = False
+                return desired
+
+    def _run(self):
+        if hasattr(self.backend, 'open'):
+            try:
+                with METRICS.timer('leds.open'):
+                    self.backend.open()
+            except Exception as e:
+                LOG.warning('LED ring unavailable, states won\'t be shown '
+                            '({})'.format(repr(e)))
+                self.available = False
+        failing = False
+        while True:
+            desired = self._next()
+            if desired is None:
+                return
+            if self.available:
+                try:
+                    with METRICS.timer('leds.show'):
+                        self.backend.show(*desired)
+                    failing = False
+                except Exception:
+                    # Log once until the ring works again
+                    if not failing:
+                        LOG.exception('Could not update LED ring')
+                    failing = True
+            with self._cond:
+                self.updates += 1
+                self._shown = desired
+                self._shown_at = time.monotonic()
+                self._cond.notify_all()
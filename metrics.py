@@ -0,0 +1,230 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Latency histograms for the skill's hot paths.
+
+    Modules time operations through the shared METRICS instance, which is
+    disabled until the skill turns it on. While disabled a timer is a
+    shared object doing nothing.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from os.path import abspath, dirname
+
+# Upper bounds of the histogram buckets in seconds, the last bucket
+# counts everything slower
+BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+           0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+DUMP_INTERVAL = 60
+
+
+class Histogram:
+    """ Counts of durations in fixed buckets, with count, total and max.
+
+        Arguments:
+            buckets (tuple): bucket upper bounds in seconds, ascending
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """ Upper bound of the bucket holding a percentile, in seconds. """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """ Summary in milliseconds, bucket counts keyed by upper bound. """
+        labels = ['<={:g}'.format(b * 1000) for b in self.buckets]
+        labels.append('>{:g}'.format(self.buckets[-1] * 1000))
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p90_ms': self.percentile(0.9) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'buckets_ms': {label: count for label, count
+                           in zip(labels, self.counts) if count}
+        }
+
+
+class _Timer:
+    """ Context manager recording the time spent in its block. """
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.monotonic() - self.start)
+
+
+class _NullTimer:
+    """ Timer used while metrics are disabled. """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """ Latency histograms per operation name.
+
+        Arguments:
+            enabled (bool): record timings
+            buckets (tuple): histogram bucket upper bounds in seconds
+    """
+    def __init__(self, enabled=False, buckets=BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.started = time.time()
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._dump_stop = None
+
+    def record(self, name, seconds):
+        """ Add a duration to the histogram of an operation. """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.record(seconds)
+
+    def timer(self, name):
+        """ Context manager timing its block as operation name. """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name=None):
+        """ Decorator timing each call of a function.
+
+            Arguments:
+                name (str): operation name, the function's name by default
+        """
+        def decorator(func):
+            op = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.monotonic()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(op, time.monotonic() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """ Summaries of all operations, see Histogram.snapshot(). """
+        with self._lock:
+            operations = {name: histogram.snapshot()
+                          for name, histogram in self._histograms.items()}
+        return {'enabled': self.enabled, 'since': self.started,
+                'time': time.time(), 'operations': operations}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.started = time.time()
+
+    def dump(self, path, extra=None):
+        """ Write a snapshot to a JSON file, replacing it atomically.
+
+            Arguments:
+                path (str): file to write
+                extra (dict): more data stored next to the snapshot
+        """
+        data = self.snapshot()
+        data.update(extra or {})
+        directory = dirname(abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.perf.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def start_dump(self, path, interval=DUMP_INTERVAL, extra=None,
+                   on_error=None):
+        """ Dump to a file every interval seconds until stop_dump().
+
+            Arguments:
+                path (str): file to write
+                interval (float): seconds between dumps
+                extra (callable): returns more data to store in each dump
+                on_error (callable): called with exceptions from a dump
+        """
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.dump(path, extra() if extra else None)
+                except Exception as e:
+                    if on_error:
+                        on_error(e)
+
+        threading.Thread(target=run, name='MetricsDump', daemon=True).start()
+
+    def stop_dump(self):
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+
+# Shared by all modules of the skill
+METRICS = Metrics()
@@ -0,0 +1,161 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Long lived control channel to PulseAudio. """
+import threading
+import time
+from subprocess import Popen, PIPE, DEVNULL, STDOUT, call
+
+from mycroft.util.log import LOG
+
+from .metrics import METRICS
+
+PROMPT = '>>> '
+# Seconds a new session is given to fail, e.g. when no sound server is
+# running yet; pacmd prints nothing on success when stdin isn't a tty
+START_CHECK = 0.2
+
+
+class PulseControl:
+    """ Sends commands to a single interactive pacmd session.
+
+        pacmd without arguments reads commands from stdin and keeps its
+        connection to the sound server open, so a command only costs a
+        write to a pipe instead of starting a process. A command counts as
+        delivered once the session has survived its start and is still
+        running after the write. Otherwise the session is restarted once,
+        then a one-off pacmd is run and its exit status used.
+
+        Arguments:
+            command (list): command starting the session, replaceable by a
+                            stand-in for testing
+    """
+    def __init__(self, command=('pacmd',)):
+        self.command = list(command)
+        self.calls = 0
+        self.total_latency = 0.0
+        self.restarts = 0
+        self.one_off = 0
+        self.failures = 0
+        self._proc = None
+        self._exited = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._proc = Popen(self.command, stdin=PIPE, stdout=PIPE,
+                           stderr=STDOUT, universal_newlines=True, bufsize=1)
+        self._exited = threading.Event()
+        self._started = False
+        threading.Thread(target=self._read_output,
+                         args=(self._proc, self._exited),
+                         name='PulseControl', daemon=True).start()
+
+    def _read_output(self, proc, exited):
+        """ Log whatever the session prints, i.e. welcome text and errors,
+            and flag the end of the session.
+        """
+        try:
+            for line in proc.stdout:
+                while line.startswith(PROMPT):
+                    line = line[len(PROMPT):]
+                line = line.strip()
+                if line and not line.startswith('Welcome to PulseAudio'):
+                    LOG.info('pacmd: {}'.format(line))
+        except (OSError, ValueError):
+            pass
+        finally:
+            exited.set()
+
+    def _alive(self):
+        return (self._proc is not None and self._proc.poll() is None and
+                not self._exited.is_set())
+
+    def _write(self, line):
+        """ Write a command to the session, starting it if needed.
+
+            Returns:
+                (bool): True if the session was still running after the
+                        write, a new session once it survived START_CHECK
+        """
+        if not self._alive():
+            if self._proc is not None:
+                self.restarts += 1
+                self._close()
+            self._start()
+        self._proc.stdin.write(line + '\n')
+        self._proc.stdin.flush()
+        if not self._started:
+            self._exited.wait(START_CHECK)
+            self._started = True
+        return self._alive()
+
+    def send(self, *args):
+        """ Send a command, e.g. send('set-sink-mute', '0', 'true').
+
+            Returns:
+                (bool): True if the command was delivered
+        """
+        line = ' '.join(str(a) for a in args)
+        start = time.monotonic()
+        with self._lock:
+            delivered = False
+            for attempt in range(2):
+                try:
+                    delivered = self._write(line)
+                except (OSError, ValueError):
+                    delivered = False
+                if delivered:
+                    break
+                # The session died before or right after the command
+                self._close()
+                if attempt == 0:
+                    self.restarts += 1
+            if not delivered:
+                LOG.warning('pacmd session unavailable, running pacmd once')
+                self.one_off += 1
+                try:
+                    delivered = call(self.command + line.split(),
+                                     stdout=DEVNULL, stderr=DEVNULL) == 0
+                except OSError as e:
+                    LOG.error('Could not run pacmd ({})'.format(e))
+            if not delivered:
+                self.failures += 1
+                LOG.error('pacmd {} was not delivered'.format(line))
+        latency = time.monotonic() - start
+        self.calls += 1
+        self.total_latency += latency
+        METRICS.record('pulse.send', latency)
+        LOG.debug('pacmd {}: {:.2f} ms'.format(line, latency * 1000))
+        return delivered
+
+    def set_sink_mute(self, sink, mute):
+        """ Returns True if the command was delivered, see send(). """
+        return self.send('set-sink-mute', sink, 'true' if mute else 'false')
+
+    def _close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+            try:
+                self._proc.wait(timeout=1)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+    def close(self):
+        """ End the session. """
+        with self._lock:
+            self._close()
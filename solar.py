@@ -0,0 +1,111 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Sunrise, noon and sunset times for automatic brightness. """
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+# Brightness level (0-30) applied at each time of day
+AUTO_LEVELS = (('Sunrise', 'sunrise', 20),  # high
+               ('Noon', 'noon', 30),        # full
+               ('Sunset', 'sunset', 5))     # dim
+
+CACHE_DAYS = 400
+
+
+class SolarSchedule:
+    """ Solar times per (latitude, longitude, timezone, date), computed once.
+
+        Arguments:
+            max_days (int): number of location/date entries kept
+    """
+    def __init__(self, max_days=CACHE_DAYS):
+        self.max_days = max_days
+        self.computed = 0
+        self._astral = None
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sun(self, lat, lon, tz, day):
+        """ Sunrise, noon and sunset for a day.
+
+            Arguments:
+                lat (float): latitude
+                lon (float): longitude
+                tz (str): timezone name, e.g. 'America/Chicago'
+                day (date): the day
+
+            Returns:
+                (dict): 'sunrise', 'noon' and 'sunset' as datetimes in tz
+        """
+        key = (lat, lon, tz, day)
+        with self._lock:
+            times = self._days.get(key)
+            if times is not None:
+                self._days.move_to_end(key)
+                return times
+        times = self._compute(lat, lon, tz, day)
+        with self._lock:
+            self._days[key] = times
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return times
+
+    def _compute(self, lat, lon, tz, day):
+        # astral and pytz are only needed once auto brightness is used
+        import astral
+        from pytz import timezone
+        if self._astral is None:
+            self._astral = astral.Astral()
+        zone = timezone(tz)
+        sky = self._astral
+        self.computed += 1
+        # Only the three times used, sun_utc() also computes dawn and dusk
+        return {
+            'sunrise': sky.sunrise_utc(day, lat, lon).astimezone(zone),
+            'noon': sky.solar_noon_utc(day, lon).astimezone(zone),
+            'sunset': sky.sunset_utc(day, lat, lon).astimezone(zone)
+        }
+
+    def precompute(self, lat, lon, tz, start, days):
+        """ Compute a range of days in one pass, e.g. a year ahead. """
+        for n in range(days):
+            self.sun(lat, lon, tz, start + timedelta(days=n))
+
+    def transitions(self, lat, lon, tz, day):
+        """ Brightness changes during a day.
+
+            Returns:
+                (list): (time_of_day, datetime, level) in time order
+        """
+        sun = self.sun(lat, lon, tz, day)
+        return sorted(((label, sun[name], level)
+                       for label, name, level in AUTO_LEVELS),
+                      key=lambda t: t[1])
+
+    def next_transition(self, lat, lon, tz, now):
+        """ The first brightness change after now.
+
+            Arguments:
+                now (datetime): timezone aware current time
+
+            Returns:
+                (tuple): (time_of_day, datetime, level)
+        """
+        from pytz import timezone
+        today = now.astimezone(timezone(tz)).date()
+        for day in (today, today + timedelta(days=1)):
+            for transition in self.transitions(lat, lon, tz, day):
+                if transition[1] > now:
+                    return transition
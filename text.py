@@ -0,0 +1,193 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Rendering text for the framebuffer. """
+import threading
+from collections import OrderedDict
+
+from .fonts import fit_font
+from .glyphs import atlas_for
+from .framebuffer import (SCREEN, BACKGROUND, BGRA32, BYTES_PER_PIXEL,
+                          encode_image)
+from .metrics import METRICS
+
+TEXT_COLOR = 'white'
+START_FONT_SIZE = 30
+# Room for a handful of full screen bands
+CACHE_BYTES = 4 * SCREEN.height * SCREEN.width * BYTES_PER_PIXEL
+
+
+def render_text(text, font_path, screen=SCREEN, background=BACKGROUND,
+                color=TEXT_COLOR):
+    """ Render text centered in a band as wide as the screen.
+
+        Arguments:
+            text (str): text to draw
+            font_path (str): path to a TrueType font
+            screen (Screen): screen geometry
+            background (Color): band background color
+            color: text color
+
+        Returns:
+            (Image): RGBA image as high as the text
+    """
+    from PIL import Image, ImageDraw  # Imported on first use
+    font = fit_font(text, font_path, START_FONT_SIZE, screen.width,
+                    screen.height)
+    left, _, right, h = font.getbbox(text)
+    w = right - left
+    image = Image.new('RGBA', (screen.width, h), background)
+    draw = ImageDraw.Draw(image)
+    # Draw to center of screen
+    draw.text(((screen.width - w) / 2, 0), text, fill=color, font=font)
+    return image
+
+
+def compose_text(text, font_path, screen=SCREEN, background=BACKGROUND,
+                 color=TEXT_COLOR):
+    """ Render text like render_text(), from cached glyphs.
+
+        Text still too wide for the screen at the starting font size is
+        wrapped onto as many lines as fit on the screen, each centered.
+
+        Arguments:
+            text (str): text to draw
+            font_path (str): path to a TrueType font
+            screen (Screen): screen geometry
+            background (Color): band background color
+            color: text color
+
+        Returns:
+            (Image): RGBA image as high as the text
+    """
+    from PIL import Image
+    font = fit_font(text, font_path, START_FONT_SIZE, screen.width,
+                    screen.height)
+    atlas = atlas_for(font_path, font.size)
+    lines = atlas.wrap(text, screen.width)
+    text_height = atlas.ascent + atlas.descent
+    max_lines = 1 + max(0, screen.height - text_height) // atlas.line_height
+    lines = lines[:max_lines]
+
+    last = [g for g, _ in atlas.layout(lines[-1])[0] if g.mask is not None]
+    bottom = max((g.top + g.mask.size[1] for g in last),
+                 default=atlas.ascent)
+    height = (len(lines) - 1) * atlas.line_height + bottom
+    coverage = Image.new('L', (screen.width, height))
+    for n, line in enumerate(lines):
+        # Half pixels round up, as when PIL draws at a fractional x
+        x = (screen.width - atlas.measure(line) + 1) // 2
+        atlas.draw(coverage, line, (x, n * atlas.line_height))
+
+    image = Image.new('RGBA', (screen.width, height), background)
+    image.paste(color, (0, 0, screen.width, height), coverage)
+    return image
+
+
+class FrameCache:
+    """ Least recently used cache of encoded frames with a byte budget.
+
+        Arguments:
+            max_bytes (int): total size of the cached frames
+    """
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get(self, key):
+        """ Return the cached frame for key or None. """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        """ Store a frame, evicting the least recently used ones. """
+        if len(frame) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._frames:
+                self.size -= len(self._frames.pop(key))
+            self._frames[key] = frame
+            self.size += len(frame)
+            while self.size > self.max_bytes:
+                _, old = self._frames.popitem(last=False)
+                self.size -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """ Counters for monitoring the cache. """
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'entries': len(self),
+                'bytes': self.size}
+
+
+class TextRenderer:
+    """ Renders text bands, reusing encoded bands for repeated text.
+
+        Text is composed from cached glyphs, see compose_text().
+
+        Arguments:
+            font_path (str): path to a TrueType font
+            screen (Screen): screen geometry
+            background (Color): band background color
+            color: text color
+            cache (FrameCache): cache for encoded bands
+            bits_per_pixel (int): pixel format of the bands
+    """
+    def __init__(self, font_path, screen=SCREEN, background=BACKGROUND,
+                 color=TEXT_COLOR, cache=None, bits_per_pixel=BGRA32):
+        self.font_path = font_path
+        self.screen = screen
+        self.background = background
+        self.color = color
+        self.bits_per_pixel = bits_per_pixel
+        self.cache = cache if cache is not None else FrameCache()
+
+    def render(self, text):
+        """ Get the encoded framebuffer band for text.
+
+            Returns:
+                (bytes): encoded rows as wide as the screen
+        """
+        key = (text, self.font_path, self.screen, self.background,
+               self.color, self.bits_per_pixel)
+        band = self.cache.get(key)
+        if band is None:
+            with METRICS.timer('text.render'):
+                band = encode_image(compose_text(text, self.font_path,
+                                                 self.screen, self.background,
+                                                 self.color),
+                                    self.bits_per_pixel)
+            self.cache.put(key, band)
+        return band
@@ -0,0 +1,183 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Timed sequences of screens played on a background thread. """
+import threading
+from collections import namedtuple
+
+from mycroft.util.log import LOG
+
+# Show screen, then wait duration seconds before the next step
+Step = namedtuple('Step', ['screen', 'duration'])
+
+
+class Sequence:
+    """ A timeline that has been handed to a Timeline to play.
+
+        Arguments:
+            steps (list): Step (or (screen, duration)) tuples
+            priority (int): sequences with a lower priority can't
+                            replace this one while it is playing
+            on_done (callable): called once the last step has finished,
+                                unless the sequence was cancelled
+    """
+    def __init__(self, steps, priority=0, on_done=None):
+        self.steps = [Step(*step) for step in steps]
+        self.priority = priority
+        self.on_done = on_done
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def cancel(self):
+        """ Stop the sequence before its next step. """
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        """ Wait for the sequence to finish or be cancelled.
+
+            Returns:
+                (bool): True if the sequence has stopped
+        """
+        return self._finished.wait(timeout)
+
+
+class Timeline:
+    """ Plays screen sequences one at a time on a worker thread.
+
+        Starting a sequence returns immediately. A new sequence replaces
+        the one playing unless that one has a higher priority.
+
+        Arguments:
+            draw (callable): called with the screen of each step
+    """
+    def __init__(self, draw):
+        self.draw = draw
+        self._cond = threading.Condition()
+        self._pending = None
+        self._current = None
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def active(self):
+        """ The sequence waiting to start or playing, or None. """
+        with self._cond:
+            return self._active()
+
+    def _active(self):
+        for seq in (self._pending, self._current):
+            if seq is not None and not (seq.cancelled or seq.finished):
+                return seq
+        return None
+
+    def play(self, steps, priority=0, on_done=None):
+        """ Start playing a sequence of steps.
+
+            Arguments:
+                steps (list): Step (or (screen, duration)) tuples, a
+                              duration of 0 keeps the screen until
+                              something else is drawn
+                priority (int): priority of the sequence
+                on_done (callable): called when the sequence completes
+
+            Returns:
+                (Sequence): the started sequence or None if a sequence
+                            with a higher priority is playing
+        """
+        seq = Sequence(steps, priority, on_done)
+        with self._cond:
+            if self._stopped:
+                return None
+            active = self._active()
+            if active is not None and active.priority > priority:
+                LOG.debug('Sequence rejected, priority {} is playing'
+                          .format(active.priority))
+                return None
+            self._cancel(None)
+            self._pending = seq
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='Timeline',
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return seq
+
+    def cancel(self, priority=None):
+        """ Cancel the active sequence.
+
+            Arguments:
+                priority (int): only cancel sequences with this priority or
+                                lower, None cancels any sequence
+        """
+        with self._cond:
+            self._cancel(priority)
+
+    def _cancel(self, priority):
+        for seq in (self._pending, self._current):
+            if seq is not None and (priority is None or
+                                    seq.priority <= priority):
+                seq.cancel()
+        if self._pending is not None and self._pending.cancelled:
+            self._pending._finished.set()
+            self._pending = None
+
+    def shutdown(self):
+        """ Cancel everything and stop the worker thread. """
+        with self._cond:
+            self._stopped = True
+            self._cancel(None)
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                seq, self._pending = self._pending, None
+                self._current = seq
+            self._play(seq)
+            with self._cond:
+                if self._current is seq:
+                    self._current = None
+
+    def _play(self, seq):
+        try:
+            for step in seq.steps:
+                if seq.cancelled:
+                    break
+                try:
+                    self.draw(step.screen)
+                except Exception:
+                    LOG.exception('Could not draw {}'.format(step.screen))
+                if step.duration:
+                    seq._cancelled.wait(step.duration)
+            if not seq.cancelled and seq.on_done:
+                seq.on_done()
+        except Exception:
+            LOG.exception('Error in screen sequence')
+        finally:
+            seq._finished.set()
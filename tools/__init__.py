@@ -0,0 +1,46 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Developer tools for the Mark 2 skill.
+
+    Run from the skill directory, e.g.
+
+        python3 -m tools.bench_write_fb
+"""
+import importlib
+import sys
+import types
+from os.path import abspath, dirname
+
+SKILL_DIR = dirname(dirname(abspath(__file__)))
+SKILL_PACKAGE = 'mark2_skill'
+
+
+def load_skill_module(name):
+    """ Import a helper module from the skill without running the skill.
+
+        The skill directory is registered as a bare package so relative
+        imports between helper modules keep working while __init__.py
+        (and its mycroft dependencies) is never executed.
+
+        Arguments:
+            name (str): module name, e.g. 'framebuffer'
+
+        Returns:
+            (module): the imported module
+    """
+    if SKILL_PACKAGE not in sys.modules:
+        package = types.ModuleType(SKILL_PACKAGE)
+        package.__path__ = [SKILL_DIR]
+        sys.modules[SKILL_PACKAGE] = package
+    return importlib.import_module('{}.{}'.format(SKILL_PACKAGE, name))
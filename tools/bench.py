@@ -0,0 +1,284 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Micro-benchmarks of the skill's rendering and hardware paths.
+
+    The skill runs on fake hardware (see tools.fakes): mycroft and
+    pixel_ring are stubbed, the framebuffer is a file and i2cset, i2cget
+    and pacmd are scripts. Each operation is timed over a number of runs
+    and its latency distribution printed.
+
+    Results can be saved as a JSON baseline and later runs compared with
+    it; the comparison fails (exit status 1) when the median of an
+    operation grew by more than the threshold.
+
+        python3 -m tools.bench [--runs N] [--only NAME ...]
+                               [--save FILE] [--compare FILE]
+                               [--threshold RATIO] [--slack MS]
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from os.path import join
+
+from . import SKILL_DIR, load_skill_module
+from .fakes import FakeDevice, Message
+
+FONT = join(SKILL_DIR, 'ui', 'NotoSansDisplay-Bold.ttf')
+TEXTS = ('ABC123', 'QX7LM2', 'Hello world', 'mycroft.ai/pair',
+         'Pairing code: X7Q2LM')
+SCREENS = ('mycroft', '0-wifi-connect')
+BRIGHTNESS = ('full', 'dim', '50%', '75 percent', '12', '80', 'auto',
+              'bogus')
+THRESHOLD = 0.25
+# Medians closer than this are never a regression, timer noise
+SLACK_MS = 0.05
+
+
+def percentile(samples, fraction):
+    """ Nearest rank percentile of sorted samples. """
+    rank = max(int(round(fraction * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def summarize(samples):
+    """ Latency distribution in milliseconds. """
+    samples = sorted(s * 1000 for s in samples)
+    return {'runs': len(samples),
+            'min': samples[0],
+            'mean': sum(samples) / len(samples),
+            'p50': percentile(samples, 0.5),
+            'p90': percentile(samples, 0.9),
+            'p99': percentile(samples, 0.99),
+            'max': samples[-1]}
+
+
+def measure(func, runs, setup=None):
+    """ Time func(n) for n in range(runs), after setup(n) if given. """
+    samples = []
+    for n in range(runs):
+        if setup:
+            setup(n)
+        start = time.perf_counter()
+        func(n)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class Suite:
+    """ The operations measured, each a method named bench_<name>.
+
+        Arguments:
+            device (FakeDevice): hardware the skill runs on
+            skill (Mark2): the skill, initialized
+            runs (int): runs per operation
+    """
+    def __init__(self, device, skill, runs):
+        self.device = device
+        self.skill = skill
+        self.runs = runs
+        self.fonts = load_skill_module('fonts')
+
+    @classmethod
+    def names(cls):
+        return [name[len('bench_'):] for name in sorted(dir(cls))
+                if name.startswith('bench_')]
+
+    def run(self, name):
+        return getattr(self, 'bench_' + name)()
+
+    def bench_fit_font(self):
+        """ Fit a text to the screen with no font loaded yet. """
+        def clear(n):
+            self.fonts.load_font.cache_clear()
+        return measure(
+            lambda n: self.fonts.fit_font(TEXTS[n % len(TEXTS)], FONT, 30),
+            self.runs, clear)
+
+    def bench_fit_font_cached(self):
+        """ Fit a text with the fonts already loaded. """
+        return measure(
+            lambda n: self.fonts.fit_font(TEXTS[n % len(TEXTS)], FONT, 30),
+            self.runs)
+
+    def bench_render_text(self):
+        """ Compose and encode a band, glyph atlases warm, cache cold. """
+        renderer = self.skill.text_renderer
+        return measure(lambda n: renderer.render(TEXTS[n % len(TEXTS)]),
+                       self.runs, lambda n: renderer.cache.clear())
+
+    def bench_write_fb(self):
+        """ Draw alternating text bands to the framebuffer. """
+        fb = self.skill.display.fb
+        bands = [self.skill.text_renderer.render(t) for t in TEXTS[:2]]
+        return measure(lambda n: fb.draw_band(bands[n % 2]), self.runs)
+
+    def bench_draw_file(self):
+        """ Copy alternating full screens from raw files. """
+        fb = self.skill.display.fb
+        paths = []
+        for name in SCREENS:
+            path = join(self.device.directory, name + '.fb')
+            with open(path, 'wb') as f:
+                f.write(self.skill.screens.load(name))
+            paths.append(path)
+        return measure(lambda n: fb.draw_file(paths[n % 2]), self.runs)
+
+    def bench_draw_screen(self):
+        """ Draw alternating preloaded screens through the asset store. """
+        fb = self.skill.display.fb
+        self.skill.screens.preload(SCREENS)
+        return measure(
+            lambda n: self.skill.screens.draw(fb, SCREENS[n % 2]),
+            self.runs)
+
+    def bench_handle_show_text(self):
+        """ Show new text, from the bus message until it is drawn. """
+        def show(n):
+            self.skill.handle_show_text(
+                Message('enclosure.mouth.text', {'text': 'code {}'.format(n)}))
+            self.skill.display.wait_idle()
+        return measure(show, self.runs)
+
+    def bench_handle_show_text_cached(self):
+        """ Show text that was shown recently, until it is drawn. """
+        def show(n):
+            self.skill.handle_show_text(
+                Message('enclosure.mouth.text', {'text': TEXTS[n % 2]}))
+            self.skill.display.wait_idle()
+        return measure(show, self.runs)
+
+    def bench_parse_brightness(self):
+        return measure(
+            lambda n: self.skill.parse_brightness(
+                BRIGHTNESS[n % len(BRIGHTNESS)]),
+            self.runs)
+
+    def bench_get_auto_time(self):
+        """ Solar times of a different day each run. """
+        today = date.today()
+        return measure(
+            lambda n: self.skill._get_auto_time(today + timedelta(days=n)),
+            self.runs)
+
+    def bench_set_volume(self):
+        """ Set alternating volumes through i2cset. """
+        return measure(
+            lambda n: self.skill.set_hardware_volume(0.3 + 0.4 * (n % 2)),
+            self.runs)
+
+    def bench_mute(self):
+        """ Toggle the sink mute through the pacmd session. """
+        def toggle(n):
+            if n % 2:
+                self.skill.unmute_pulseaudio()
+            else:
+                self.skill.mute_pulseaudio()
+        return measure(toggle, self.runs)
+
+    def bench_led_handlers(self):
+        """ Bus handlers of a skill handler starting and completing. """
+        data = {'handler': 'WeatherSkill.handle_current_weather'}
+
+        def handlers(n):
+            self.skill.on_handler_started(
+                Message('mycroft.skill.handler.start', data))
+            self.skill.on_handler_complete(
+                Message('mycroft.skill.handler.complete', data))
+        return measure(handlers, self.runs)
+
+
+def compare(results, baseline, threshold, slack):
+    """ Find operations whose median regressed against the baseline.
+
+        Returns:
+            (list): (name, baseline ms, current ms) per regression
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        before, after = base['p50'], result['p50']
+        if after > before * (1 + threshold) and after - before > slack:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--only', nargs='+', choices=Suite.names(),
+                        help='operations to measure')
+    parser.add_argument('--bpp', type=int, default=32, choices=(32, 16),
+                        help='framebuffer bits per pixel')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed growth of the median, as a ratio')
+    parser.add_argument('--slack', type=float, default=SLACK_MS,
+                        help='growth in ms always allowed')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        device = FakeDevice(tmp, args.bpp)
+        skill = device.load_skill()
+        skill.reset_face(Message('mycroft.ready'))  # Stop the animation
+        skill.display.wait_idle()
+        suite = Suite(device, skill, args.runs)
+        print('{:24} {:>5} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'operation', 'runs', 'min ms', 'p50 ms', 'p90 ms', 'p99 ms',
+            'max ms'))
+        for name in args.only or suite.names():
+            try:
+                result = summarize(suite.run(name))
+            except ImportError as e:
+                print('{:24} skipped ({})'.format(name, e))
+                continue
+            results[name] = result
+            print('{:24} {runs:5} {min:9.3f} {p50:9.3f} {p90:9.3f} '
+                  '{p99:9.3f} {max:9.3f}'.format(name, **result))
+        writes = device.writes()
+        skill.shutdown()
+    print('device commands: {}'.format(', '.join(
+        '{} {}'.format(k, v) for k, v in sorted(writes.items()))))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'machine': platform.platform(),
+                       'python': platform.python_version(),
+                       'runs': args.runs, 'bits_per_pixel': args.bpp,
+                       'results': results}, f, indent=2, sort_keys=True)
+        print('saved {}'.format(args.save))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold,
+                              args.slack)
+        for name, before, after in regressions:
+            print('REGRESSION {}: median {:.3f} ms -> {:.3f} ms '
+                  '(+{:.0f}%)'.format(name, before, after,
+                                      100 * (after / before - 1)))
+        if regressions:
+            sys.exit(1)
+        print('no regression against {} (threshold {:.0f}%)'.format(
+            args.compare, 100 * args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Compare the ways FrameBuffer.draw_file() can copy a raw frame.
+
+    Two splash screens are drawn alternately so every draw changes the
+    whole screen. By default the framebuffer is a file in /dev/shm
+    (tmpfs); pass --dev /dev/fb0 to measure the real device.
+
+        python3 -m tools.bench_draw_file [--dev PATH] [--runs N]
+"""
+import argparse
+import os
+import tempfile
+from os.path import exists, join
+
+from . import SKILL_DIR, load_skill_module
+
+fb = load_skill_module('framebuffer')
+assets = load_skill_module('assets')
+
+SCREENS = ('mycroft', '0-wifi-connect')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dev', help='framebuffer or stand-in file')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory(
+        dir='/dev/shm' if exists('/dev/shm') else None)
+    store = assets.AssetStore(join(SKILL_DIR, 'ui'))
+    frames = []
+    for name in SCREENS:
+        path = join(tmp.name, name + assets.RAW_EXT)
+        with open(path, 'wb') as f:
+            f.write(store.load(name))
+        frames.append(path)
+    dev = args.dev or join(tmp.name, 'fb0')
+    if not exists(dev):
+        open(dev, 'wb').close()
+
+    methods = [m for m in ('copy_file_range', 'sendfile')
+               if hasattr(os, m)] + ['stream']
+    print('drawing to {}, {} runs per method'.format(dev, args.runs))
+    for method in methods:
+        buf = fb.FrameBuffer(dev)
+        # Restrict the kernel side methods to the one being measured
+        buf.copy_methods = [method] if method != 'stream' else []
+        for i in range(args.runs):
+            buf.draw_file(frames[i % len(frames)])
+        used = ', '.join(buf.copy_stats)
+        print('{:16} {:8.1f} MB/s  (used: {})'.format(
+            method, buf.throughput(method) / 1e6, used))
+        buf.close()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
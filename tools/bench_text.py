@@ -0,0 +1,65 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Compare text drawn by PIL with text composed from the glyph atlas.
+
+    For each string the number of differing bytes and the time per render
+    of both paths is printed. Strings too wide for the screen are only
+    timed, PIL clips them while the atlas wraps them.
+
+        python3 -m tools.bench_text [--runs N] [TEXT ...]
+"""
+import argparse
+import time
+from os.path import join
+
+from . import SKILL_DIR, load_skill_module
+
+text = load_skill_module('text')
+
+FONT = join(SKILL_DIR, 'ui', 'NotoSansDisplay-Bold.ttf')
+SAMPLES = ('ABC123', 'QX7LM2', 'Hello world', 'mycroft.ai/pair',
+           'Pairing code: X7Q2LM',
+           'Please go to home.mycroft.ai and enter the pairing code')
+
+
+def timed(render, sample, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        image = render(sample, FONT)
+    return image, (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('text', nargs='*', default=SAMPLES)
+    args = parser.parse_args()
+
+    print('{:24} {:>10} {:>10} {:>10}'.format('text', 'PIL ms', 'atlas ms',
+                                              'diff'))
+    for sample in args.text:
+        text.compose_text(sample, FONT)  # Fill the atlas
+        pil, pil_time = timed(text.render_text, sample, args.runs)
+        atlas, atlas_time = timed(text.compose_text, sample, args.runs)
+        if pil.size == atlas.size:
+            a, b = pil.tobytes(), atlas.tobytes()
+            diff = str(sum(x != y for x, y in zip(a, b)))
+        else:
+            diff = 'wrapped'
+        print('{:24} {:10.2f} {:10.2f} {:>10}'.format(
+            sample[:24], pil_time * 1000, atlas_time * 1000, diff))
+
+
+if __name__ == '__main__':
+    main()
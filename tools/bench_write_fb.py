@@ -0,0 +1,117 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Compare the old per-pixel framebuffer writer with the bulk encoder.
+
+    Both writers draw the same text band to a regular file standing in for
+    /dev/fb0.
+
+        python3 -m tools.bench_write_fb [--runs N] [--text TEXT]
+"""
+import argparse
+import struct
+import tempfile
+import time
+from os.path import join
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import SKILL_DIR, load_skill_module
+
+fb = load_skill_module('framebuffer')
+
+
+def legacy_write_fb(im, dev):
+    """ The original per-pixel implementation of write_fb(). """
+    cols = []
+    for j in range(im.size[1] - 1):
+        for i in range(im.size[0]):
+            R, G, B, A = im.getpixel((i, j))
+            cols.append(struct.pack('BBBB', B, G, R, A))
+    with open(dev, 'wb') as f:
+        color = [fb.BACKGROUND.blue, fb.BACKGROUND.green,
+                 fb.BACKGROUND.red, 0]
+        f.write(struct.pack('BBBB', *color) *
+                ((fb.SCREEN.height - im.size[1]) // 2 * fb.SCREEN.width))
+        f.write(b''.join(cols))
+        f.write(struct.pack('BBBB', *color) *
+                ((fb.SCREEN.height - im.size[1]) // 2 * fb.SCREEN.width))
+
+
+def bulk_write_fb(im, dev):
+    """ The current write_fb() without the skill's logging. """
+    with open(dev, 'wb') as f:
+        f.write(fb.encode_frame(im))
+
+
+class MappedWriter:
+    """ Draw through a FrameBuffer kept open between runs. """
+    def __init__(self):
+        self.fb = None
+
+    def __call__(self, im, dev):
+        if self.fb is None:
+            self.fb = fb.FrameBuffer(dev)
+        self.fb.draw_image(im)
+
+
+def render_text(text):
+    font_path = join(SKILL_DIR, 'ui', 'NotoSansDisplay-Bold.ttf')
+    font = ImageFont.truetype(font_path, 60)
+    left, _, right, h = font.getbbox(text)
+    w = right - left
+    image = Image.new('RGBA', (fb.SCREEN.width, h), fb.BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    draw.text(((fb.SCREEN.width - w) / 2, 0), text, fill='white', font=font)
+    return image
+
+
+def best_of(func, im, dev, runs):
+    times = []
+    for _ in range(runs):
+        start = time.monotonic()
+        func(im, dev)
+        times.append(time.monotonic() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--text', default='ABC123')
+    args = parser.parse_args()
+
+    im = render_text(args.text)
+    with tempfile.TemporaryDirectory() as tmp:
+        dev = join(tmp, 'fb0')
+        before = best_of(legacy_write_fb, im, dev, args.runs)
+        after = best_of(bulk_write_fb, im, dev, args.runs)
+        mapped = MappedWriter()
+        mapped(render_text(args.text + '!'), dev)  # Start from other text
+        start = mapped.fb.bytes_written
+        mapped_time = best_of(mapped, im, dev, args.runs)
+        mapped_bytes = mapped.fb.bytes_written - start
+        mapped.fb.close()
+    print('image {}x{}, best of {} runs'.format(im.size[0], im.size[1],
+                                                args.runs))
+    print('per-pixel: {:8.2f} ms'.format(before * 1000))
+    print('bulk:      {:8.2f} ms'.format(after * 1000))
+    print('speedup:   {:8.1f}x'.format(before / after))
+    print('mmap:      {:8.2f} ms, {} bytes written over {} runs '
+          '(full frame writes {} bytes each)'.format(
+              mapped_time * 1000, mapped_bytes, args.runs,
+              fb.SCREEN.height * fb.SCREEN.width * fb.BYTES_PER_PIXEL))
+
+
+if __name__ == '__main__':
+    main()
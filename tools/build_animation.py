@@ -0,0 +1,105 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Build a delta encoded animation (.fba) from a sequence of frames.
+
+    Frames are PNG images, raw (.fb) or packed (.fbz) screens, or names of
+    screens in the ui directory. The animation is played back in memory
+    and compared with the source frames before it is written.
+
+    By default ui/loading.fba is built, blinking the "LOADING..." text of
+    the loading screen:
+
+        python3 -m tools.build_animation [-o OUT.fba] [--fps N] [FRAME ...]
+"""
+import argparse
+import sys
+from os.path import join
+
+from . import SKILL_DIR, load_skill_module
+
+fb = load_skill_module('framebuffer')
+assets = load_skill_module('assets')
+animation = load_skill_module('animation')
+
+DEFAULT_FRAMES = ('loading', 'mycroft')
+DEFAULT_OUTPUT = join(SKILL_DIR, 'ui', 'loading' + animation.ANIMATION_EXT)
+DEFAULT_FPS = 2
+
+
+def load_frame(source, store):
+    """ Read one frame as raw BGRA32 data. """
+    if source.endswith('.png'):
+        from PIL import Image
+        im = Image.open(source)
+        if im.size != fb.SCREEN:
+            raise assets.AssetError('{} is {}x{}, expected {}x{}'.format(
+                source, im.size[0], im.size[1], fb.SCREEN.width,
+                fb.SCREEN.height))
+        return fb.encode_image(im)
+    with_ext = (source.endswith(assets.RAW_EXT) or
+                source.endswith(assets.PACKED_EXT))
+    if not with_ext:
+        return store.load(source)
+    with open(source, 'rb') as f:
+        data = f.read()
+    if source.endswith(assets.PACKED_EXT):
+        return assets.unpack_frame(data)
+    return data
+
+
+def verify(packed, frames):
+    """ Play the animation in memory, including the loop back to the
+        start, and compare every frame with its source.
+    """
+    canvas = animation.Canvas(animation.Animation(packed))
+    expected = list(frames[1:]) + [frames[0]]
+    for n, frame in enumerate(expected, 1):
+        canvas.advance()
+        if canvas.data != frame:
+            raise assets.AssetError('Frame {} differs'.format(
+                n % len(frames)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('frames', nargs='*', default=DEFAULT_FRAMES)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS)
+    parser.add_argument('--tile', type=int, default=animation.TILE_SIZE)
+    args = parser.parse_args()
+
+    store = assets.AssetStore(join(SKILL_DIR, 'ui'))
+    frames = [load_frame(source, store) for source in args.frames]
+    packed = animation.build_animation(frames, fps=args.fps, tile=args.tile)
+    try:
+        verify(packed, frames)
+    except assets.AssetError as e:
+        print('Verification failed: {}'.format(e))
+        sys.exit(1)
+    with open(args.output, 'wb') as f:
+        f.write(packed)
+
+    anim = animation.Animation(packed)
+    print('{}: {} frames at {} fps, {} bytes (raw frames: {} bytes)'.format(
+        args.output, anim.frames, anim.fps, len(packed),
+        sum(len(frame) for frame in frames)))
+    for n in range(1, anim.frames + 1):
+        tiles = anim.delta(n)
+        print('  frame {} -> {}: {} tiles, {} bytes of pixels'.format(
+            n - 1, n % anim.frames, len(tiles),
+            sum(len(tile[4]) for tile in tiles)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Check framebuffer detection and drawing against fake devices.
+
+    For each panel configuration a fake sysfs tree and a file standing in
+    for /dev/fb0 are created. A stored screen and a text band are drawn,
+    then the file is decoded again and compared with the source images.
+
+        python3 -m tools.check_fb [--runs N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from os.path import join
+
+from PIL import Image
+
+from . import SKILL_DIR, load_skill_module
+
+fb = load_skill_module('framebuffer')
+assets = load_skill_module('assets')
+text = load_skill_module('text')
+
+FONT = join(SKILL_DIR, 'ui', 'NotoSansDisplay-Bold.ttf')
+SCREEN_NAME = 'mycroft'
+
+# name, bits per pixel, padding per row, virtual height
+PANELS = (('bgra32', 32, 0, 800),
+          ('rgb565', 16, 0, 800),
+          ('bgra32 padded', 32, 64, 800),
+          ('rgb565 padded', 16, 32, 800),
+          ('rgb565 panning', 16, 0, 1600))
+
+# Largest channel error expected after reducing 8 bits to 5 or 6
+MAX_ERROR = {32: 0, 16: 7}
+
+
+def make_sysfs(directory, bits_per_pixel, padding, virtual_height):
+    width, height = fb.SCREEN.width, fb.SCREEN.height
+    attributes = {
+        'virtual_size': '{},{}'.format(width, virtual_height),
+        'mode': 'U:{}x{}p-0'.format(width, height),
+        'bits_per_pixel': str(bits_per_pixel),
+        'stride': str(width * bits_per_pixel // 8 + padding)
+    }
+    os.makedirs(directory)
+    for name, value in attributes.items():
+        with open(join(directory, name), 'w') as f:
+            f.write(value + '\n')
+
+
+def read_back(buf):
+    """ Decode the stand-in device file into an RGB image. """
+    with open(buf.dev, 'rb') as f:
+        data = f.read(buf.size)
+    rows = b''.join(data[n:n + buf.row_bytes]
+                    for n in range(0, len(data), buf.stride))
+    raw = 'BGR;16' if buf.bits_per_pixel == fb.RGB565 else 'BGRX'
+    return Image.frombytes('RGB', (buf.screen.width, buf.screen.height),
+                           rows, 'raw', raw)
+
+
+def max_error(a, b):
+    return max(abs(x - y) for x, y in zip(a.tobytes(), b.tobytes()))
+
+
+def check_panel(tmp, store, name, bits_per_pixel, padding, virtual_height,
+                runs):
+    sysfs = join(tmp, name.replace(' ', '-'))
+    make_sysfs(sysfs, bits_per_pixel, padding, virtual_height)
+    dev = join(sysfs, 'dev')
+    open(dev, 'wb').close()
+    buf = fb.open_framebuffer(dev, sysfs)
+    errors = []
+
+    frame = store.load(SCREEN_NAME)
+    expected = Image.frombytes('RGB', (buf.screen.width, buf.screen.height),
+                               frame, 'raw', 'BGRX')
+    store.draw(buf, SCREEN_NAME)
+    error = max_error(read_back(buf), expected)
+    if error > MAX_ERROR[bits_per_pixel]:
+        errors.append('screen differs by {}'.format(error))
+
+    band = text.compose_text('ABC123', FONT, buf.screen)
+    buf.draw_image(band)
+    expected = Image.new('RGB', buf.screen, fb.BACKGROUND)
+    expected.paste(band.convert('RGB'),
+                   (0, (buf.screen.height - band.size[1]) // 2))
+    error = max_error(read_back(buf), expected)
+    if error > MAX_ERROR[bits_per_pixel]:
+        errors.append('text differs by {}'.format(error))
+
+    # Alternate two full screens so every draw rewrites the whole frame
+    store.preload([SCREEN_NAME, '0-wifi-connect'])
+    start_bytes = buf.bytes_written
+    start = time.monotonic()
+    for n in range(runs):
+        store.draw(buf, (SCREEN_NAME, '0-wifi-connect')[n % 2])
+    elapsed = (time.monotonic() - start) / runs
+    per_frame = (buf.bytes_written - start_bytes) // runs
+    buf.close()
+
+    print('{:16} {}x{} stride {:5} {:9} bytes/frame {:6.1f} ms  {}'.format(
+        name, buf.screen.width, buf.screen.height, buf.stride, per_frame,
+        elapsed * 1000, ', '.join(errors) or 'ok'))
+    return not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for panel in PANELS:
+            store = assets.AssetStore(join(SKILL_DIR, 'ui'))
+            ok = check_panel(tmp, store, *panel, runs=args.runs) and ok
+
+        # Formats the skill can't drive must be refused
+        make_sysfs(join(tmp, 'rgb24'), 24, 0, 800)
+        try:
+            fb.open_framebuffer(join(tmp, 'rgb24', 'dev'),
+                                join(tmp, 'rgb24'))
+            print('24 bits per pixel was not refused')
+            ok = False
+        except ValueError:
+            pass
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Check the cached solar times against astral's Location.sun().
+
+    For each location, days spread over a year are computed with
+    SolarSchedule and with astral.Location.sun(), the way the skill
+    computed them before the cache. Sunrise, noon and sunset must be
+    identical and transitions() must list them in time order. Days
+    without a sunrise or sunset, near the poles, must fail in both.
+
+    Location.sun() also computes dawn and dusk and raises on white
+    nights, when the sun still rises and sets; those days are compared
+    with Location.sunrise(), solar_noon() and sunset() and counted.
+
+        python3 -m tools.check_solar [--year YEAR] [--step DAYS]
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from . import load_skill_module
+
+solar = load_skill_module('solar')
+
+# name, region, latitude, longitude, timezone
+LOCATIONS = (('Lawrence', 'USA', 38.971669, -95.23525, 'America/Chicago'),
+             ('London', 'England', 51.5072, -0.1276, 'Europe/London'),
+             ('Quito', 'Ecuador', -0.1807, -78.4678, 'America/Guayaquil'),
+             ('Sydney', 'Australia', -33.8688, 151.2093,
+              'Australia/Sydney'),
+             ('Honolulu', 'USA', 21.3069, -157.8583, 'Pacific/Honolulu'),
+             ('Kolkata', 'India', 22.5726, 88.3639, 'Asia/Kolkata'),
+             ('Tromso', 'Norway', 69.6492, 18.9553, 'Europe/Oslo'))
+NAMES = ('sunrise', 'noon', 'sunset')
+
+
+def reference(location, day):
+    """ Times from astral.
+
+        Returns:
+            (dict, bool): times, None when the sun doesn't rise or set,
+                          and whether Location.sun() raised
+    """
+    try:
+        sun = location.sun(date=day, local=True)
+        return {name: sun[name] for name in NAMES}, False
+    except Exception:  # AstralError, or ValueError from astral 1.x
+        pass
+    try:
+        return {'sunrise': location.sunrise(day, local=True),
+                'noon': location.solar_noon(day, local=True),
+                'sunset': location.sunset(day, local=True)}, True
+    except Exception:
+        return None, True
+
+
+def cached(schedule, lat, lon, tz, day):
+    """ Times from SolarSchedule, None when it can't compute them. """
+    try:
+        return dict(schedule.sun(lat, lon, tz, day))
+    except Exception:
+        return None
+
+
+def check_location(schedule, name, region, lat, lon, tz, days):
+    """ Compare one location over the days.
+
+        Returns:
+            (list, int): description of each mismatch and the number of
+                         days Location.sun() raised on
+    """
+    import astral
+    location = astral.Location((name, region, lat, lon, tz, 0))
+    errors = []
+    sun_failed = 0
+    for day in days:
+        expected, raised = reference(location, day)
+        sun_failed += raised
+        actual = cached(schedule, lat, lon, tz, day)
+        if expected != actual:
+            errors.append('{} {}: expected {}, got {}'.format(
+                name, day, expected, actual))
+            continue
+        if actual is None:
+            continue
+        order = [when for _, when, _ in schedule.transitions(lat, lon, tz,
+                                                             day)]
+        if order != sorted(expected.values()):
+            errors.append('{} {}: transitions out of order'.format(name,
+                                                                   day))
+    return errors, sun_failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--year', type=int, default=date.today().year)
+    parser.add_argument('--step', type=int, default=7,
+                        help='days between the days checked')
+    args = parser.parse_args()
+
+    start = date(args.year, 1, 1)
+    days = [start + timedelta(days=n)
+            for n in range(0, 366, max(args.step, 1))
+            if (start + timedelta(days=n)).year == args.year]
+    schedule = solar.SolarSchedule()
+    errors = []
+    for name, region, lat, lon, tz in LOCATIONS:
+        found, sun_failed = check_location(schedule, name, region, lat,
+                                           lon, tz, days)
+        print('{:10} {:8.3f} {:9.3f} {:20} {:3} days  {}{}'.format(
+            name, lat, lon, tz, len(days),
+            '{} mismatches'.format(len(found)) if found else 'ok',
+            ', sun() raised on {} days'.format(sun_failed)
+            if sun_failed else ''))
+        errors += found
+    for error in errors:
+        print(error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Compile the screens in ui/src into packed frames for displays.
+
+    ui/src/screens.json lists the screens. Each has a source image drawn
+    for the design geometry and optional text drawn over it with the
+    bundled fonts:
+
+        {
+            "design": [480, 800],
+            "screens": {
+                "3-wifi-success": {
+                    "image": "3-wifi-success.png",
+                    "background": [34, 167, 240],
+                    "text": [{"text": "Connected", "y": 520, "size": 48,
+                              "font": "NotoSansDisplay-Bold.ttf",
+                              "color": [255, 255, 255]}]
+                }
+            }
+        }
+
+    Text is centered unless "x" is given; positions and sizes are in
+    design pixels. For a display of another geometry the image is scaled
+    to fit and centered on the background color (the default blue), and
+    the text is drawn at the scaled size.
+
+    Screens for the design geometry at 32 bits per pixel are written to
+    ui/, the frames shipped with the skill. Other displays get a
+    directory named after them, e.g. ui/480x800-16, which the skill uses
+    when it detects that display. Screens are rendered in parallel and a
+    screen is only rebuilt when the hash of its inputs changed.
+
+        python3 -m tools.compile_assets [--target WxH[-BPP] ...] [--detect]
+                                        [--jobs N] [--force] [--check]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from os.path import exists, join
+
+from . import SKILL_DIR, load_skill_module
+
+fb = load_skill_module('framebuffer')
+assets = load_skill_module('assets')
+fonts = load_skill_module('fonts')
+
+UI_DIR = join(SKILL_DIR, 'ui')
+SOURCE_DIR = join(UI_DIR, 'src')
+MANIFEST = 'screens.json'
+BUILD_INDEX = '.build.json'
+DEFAULT_FONT = 'NotoSansDisplay-Bold.ttf'
+TEXT_COLOR = (255, 255, 255)
+# Changing how screens are rendered must change this to rebuild them
+COMPILER_VERSION = 1
+
+
+def parse_target(value):
+    """ Parse WxH or WxH-BPP into (Screen, bits per pixel). """
+    try:
+        size, _, bpp = value.partition('-')
+        width, height = (int(n) for n in size.split('x'))
+        bits_per_pixel = int(bpp) if bpp else fb.BGRA32
+    except ValueError:
+        raise argparse.ArgumentTypeError('{} is not WxH[-BPP]'.format(value))
+    if bits_per_pixel not in fb.FORMATS:
+        raise argparse.ArgumentTypeError(
+            'Unsupported pixel format {}'.format(bits_per_pixel))
+    return fb.Screen(width, height), bits_per_pixel
+
+
+def output_dir(target, design):
+    screen, bits_per_pixel = target
+    if screen == design and bits_per_pixel == fb.BGRA32:
+        return UI_DIR
+    return join(UI_DIR, assets.target_dir(screen, bits_per_pixel))
+
+
+def font_files(spec):
+    return sorted({t.get('font', DEFAULT_FONT) for t in spec.get('text', [])})
+
+
+def input_hash(name, spec, target, design):
+    """ Hash of everything a compiled screen depends on. """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([COMPILER_VERSION, name, spec, target, design],
+                             sort_keys=True).encode())
+    paths = [join(SOURCE_DIR, spec['image'])]
+    paths += [join(UI_DIR, font) for font in font_files(spec)]
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def render(spec, target, design):
+    """ Render a screen for a display.
+
+        Returns:
+            (Image): RGB image of the display's size
+    """
+    from PIL import Image, ImageDraw
+    screen, _ = target
+    im = Image.open(join(SOURCE_DIR, spec['image'])).convert('RGB')
+    if im.size != design:
+        raise assets.AssetError('{} is {}x{}, the design is {}x{}'.format(
+            spec['image'], im.size[0], im.size[1], *design))
+    scale = min(screen.width / design.width, screen.height / design.height)
+    left, top = 0, 0
+    if screen != design:
+        size = (round(design.width * scale), round(design.height * scale))
+        left = (screen.width - size[0]) // 2
+        top = (screen.height - size[1]) // 2
+        canvas = Image.new('RGB', screen,
+                           tuple(spec.get('background', fb.BACKGROUND)))
+        canvas.paste(im.resize(size, Image.LANCZOS), (left, top))
+        im = canvas
+    draw = ImageDraw.Draw(im)
+    for overlay in spec.get('text', []):
+        font = fonts.load_font(join(UI_DIR, overlay.get('font', DEFAULT_FONT)),
+                               max(round(overlay['size'] * scale), 1))
+        if 'x' in overlay:
+            x = left + round(overlay['x'] * scale)
+        else:
+            x = (screen.width - round(font.getlength(overlay['text']))) // 2
+        draw.text((x, top + round(overlay['y'] * scale)), overlay['text'],
+                  fill=tuple(overlay.get('color', TEXT_COLOR)), font=font)
+    return im
+
+
+def compile_screen(name, spec, target, design):
+    """ Render, encode and pack one screen, checking the round trip.
+
+        Runs in a worker process.
+
+        Returns:
+            (str, bytes): name and packed frame
+    """
+    screen, bits_per_pixel = target
+    data = fb.encode_image(render(spec, target, design), bits_per_pixel)
+    packed = assets.pack_frame(data, screen, bits_per_pixel // 8)
+    if assets.unpack_frame(packed) != data:
+        raise assets.AssetError('Round trip of {} failed'.format(name))
+    return name, packed
+
+
+def load_index(directory):
+    try:
+        with open(join(directory, BUILD_INDEX)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target', type=parse_target, action='append',
+                        help='display as WxH or WxH-BPP, e.g. 480x800-16')
+    parser.add_argument('--detect', action='store_true',
+                        help='add the display of this machine')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='screens rendered in parallel')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild unchanged screens')
+    parser.add_argument('--check', action='store_true',
+                        help='only report screens out of date, exit 1 if '
+                        'any are')
+    args = parser.parse_args()
+
+    with open(join(SOURCE_DIR, MANIFEST)) as f:
+        manifest = json.load(f)
+    design = fb.Screen(*manifest['design'])
+    targets = args.target or [(design, fb.BGRA32)]
+    if args.detect:
+        info = fb.read_fb_info(join(fb.SYSFS_GRAPHICS, 'fb0'))
+        targets.append((info.screen, info.bits_per_pixel))
+
+    jobs = []  # (name, spec, target, hash)
+    indexes = {}
+    skipped = 0
+    for target in targets:
+        directory = output_dir(target, design)
+        index = indexes[directory] = load_index(directory)
+        for name, spec in sorted(manifest['screens'].items()):
+            digest = input_hash(name, spec, target, design)
+            path = join(directory, name + assets.PACKED_EXT)
+            if not args.force and index.get(name) == digest and exists(path):
+                skipped += 1
+                continue
+            jobs.append((name, spec, target, digest))
+
+    if args.check:
+        for name, _, (screen, bpp), _ in jobs:
+            print('out of date: {} for {}'.format(
+                name, assets.target_dir(screen, bpp)))
+        print('{} up to date, {} out of date'.format(skipped, len(jobs)))
+        sys.exit(1 if jobs else 0)
+
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        futures = [(pool.submit(compile_screen, name, spec, target, design),
+                    target, digest)
+                   for name, spec, target, digest in jobs]
+        for future, target, digest in futures:
+            name, packed = future.result()
+            directory = output_dir(target, design)
+            os.makedirs(directory, exist_ok=True)
+            with open(join(directory, name + assets.PACKED_EXT), 'wb') as f:
+                f.write(packed)
+            indexes[directory][name] = digest
+            print('{:24} {:12} {:>7} bytes'.format(
+                name, assets.target_dir(*target), len(packed)))
+
+    for directory, index in indexes.items():
+        with open(join(directory, BUILD_INDEX), 'w') as f:
+            json.dump(index, f, indent=4, sort_keys=True)
+            f.write('\n')
+    print('{} compiled, {} unchanged'.format(len(jobs), skipped))
+
+
+if __name__ == '__main__':
+    main()
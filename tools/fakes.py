@@ -0,0 +1,335 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Run the whole skill on a plain Linux box.
+
+    install_stubs() registers minimal stand-ins for the parts of mycroft
+    the skill imports and for pixel_ring. FakeDevice builds the hardware
+    in a directory: a file standing in for /dev/fb0 with its sysfs
+    attributes, a backlight, and i2cset, i2cget, pacmd and pacat
+    executables recording what they are sent. FakeDevice.load_skill()
+    then creates and initializes the Mark2 skill against them.
+"""
+import json
+import logging
+import os
+import stat
+import sys
+import threading
+import types
+from collections import Counter, defaultdict
+from functools import partial
+from os.path import join
+
+from . import SKILL_DIR, load_skill_module
+
+LANG = 'en-us'
+# Location of the default mycroft configuration
+LOCATION = {
+    'city': {'name': 'Lawrence'},
+    'coordinate': {'latitude': 38.971669, 'longitude': -95.23525},
+    'timezone': {'code': 'America/Chicago', 'offset': -21600000}
+}
+
+
+class CallRecorder:
+    """ Accepts any method call and records it.
+
+        Arguments:
+            name (str): name used in the records
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def record(*args, **kwargs):
+            with self._lock:
+                self.calls.append((method, args))
+                self.counts[method] += 1
+        return record
+
+
+class Message:
+    """ Stand-in for mycroft.messagebus.message.Message. """
+    def __init__(self, msg_type, data=None, context=None):
+        self.type = msg_type
+        self.data = data or {}
+        self.context = context or {}
+
+    def response(self, data=None, context=None):
+        return Message(self.type + '.response', data,
+                       context or self.context)
+
+    def __repr__(self):
+        return 'Message({!r}, {!r})'.format(self.type, self.data)
+
+
+class FakeBus:
+    """ In-process message bus delivering messages synchronously.
+
+        Messages emitted are recorded in emitted and delivered to the
+        handlers registered for their type, like the real bus echoes a
+        client's messages back to it.
+    """
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self.emitted = []
+
+    def on(self, msg_type, handler):
+        self.handlers[msg_type].append(handler)
+
+    def remove(self, msg_type, handler):
+        if handler in self.handlers.get(msg_type, []):
+            self.handlers[msg_type].remove(handler)
+
+    def emit(self, message):
+        self.emitted.append(message)
+        self.dispatch(message)
+
+    def dispatch(self, message):
+        """ Call the handlers of a message, in registration order. """
+        for handler in list(self.handlers.get(message.type, [])):
+            handler(message)
+
+
+class SkillSettings(dict):
+    """ Stand-in for the skill's settings, changed by the caller. """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_changed = None
+
+    def set_changed_callback(self, callback):
+        self.on_changed = callback
+
+    def changed(self):
+        """ Notify the skill, as when settings arrive from the web. """
+        if self.on_changed:
+            self.on_changed()
+
+
+class MycroftSkill:
+    """ Stand-in for mycroft.skills.core.MycroftSkill. """
+    def __init__(self, name=None):
+        self.name = name
+        self.root_dir = SKILL_DIR
+        self.lang = LANG
+        self.settings = SkillSettings()
+        self.log = logging.getLogger(name or 'skill')
+        self.bus = None
+        self.location = LOCATION
+        self.enclosure = CallRecorder('enclosure')
+        self.spoken = []
+        self.scheduled = {}
+
+    def add_event(self, name, handler):
+        self.bus.on(name, handler)
+
+    def find_resource(self, res_name, res_dirname=None):
+        return join(self.root_dir, res_dirname or '', res_name)
+
+    def translate_namedvalues(self, name, delim=','):
+        values = {}
+        path = join(self.root_dir, 'locale', self.lang, name + '.value')
+        with open(path) as f:
+            for line in f:
+                if line.startswith('#') or delim not in line:
+                    continue
+                key, value = line.split(delim, 1)
+                values[key.strip()] = value.strip()
+        return values
+
+    def speak_dialog(self, key, data=None, expect_response=False):
+        self.spoken.append((key, data))
+
+    def get_response(self, dialog='', data=None):
+        return None
+
+    def schedule_event(self, handler, when, data=None, name=None):
+        self.scheduled[name] = (when, data)
+
+    def cancel_scheduled_event(self, name):
+        self.scheduled.pop(name, None)
+
+    def shutdown(self):
+        pass
+
+
+def intent_file_handler(intent_file):
+    def decorator(func):
+        return func
+    return decorator
+
+
+class Configuration:
+    """ Stand-in for mycroft.configuration.config.Configuration. """
+    @staticmethod
+    def get():
+        return {}
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install_stubs(user_config):
+    """ Register the stand-in mycroft and pixel_ring modules.
+
+        Arguments:
+            user_config (str): path used as the user configuration file
+
+        Returns:
+            (CallRecorder): the pixel ring, recording the calls it gets
+    """
+    log = logging.getLogger('mark2')
+
+    def load_commented_json(path):
+        with open(path) as f:
+            return json.loads(''.join(line for line in f
+                                      if not line.strip().startswith('//')))
+
+    _module('mycroft', intent_file_handler=intent_file_handler,
+            __path__=[])
+    _module('mycroft.api', is_paired=lambda: True)
+    _module('mycroft.messagebus', __path__=[])
+    _module('mycroft.messagebus.message', Message=Message)
+    _module('mycroft.skills', __path__=[])
+    _module('mycroft.skills.core', MycroftSkill=MycroftSkill)
+    _module('mycroft.util', __path__=[], play_wav=lambda path: None)
+    _module('mycroft.util.log', LOG=log)
+    _module('mycroft.util.parse',
+            normalize=lambda text, lang=LANG: text.lower().strip())
+    _module('mycroft.util.json_helper',
+            load_commented_json=load_commented_json)
+    _module('mycroft.configuration', __path__=[])
+    _module('mycroft.configuration.config', USER_CONFIG=user_config,
+            Configuration=Configuration)
+    ring = CallRecorder('pixel_ring')
+    _module('pixel_ring', pixel_ring=ring)
+    return ring
+
+
+def _write(path, content, mode=None):
+    with open(path, 'w') as f:
+        f.write(content)
+    if mode:
+        os.chmod(path, os.stat(path).st_mode | mode)
+
+
+class FakeDevice:
+    """ Mark 2 hardware faked in a directory.
+
+        Arguments:
+            directory (str): empty directory to build the device in
+            bits_per_pixel (int): framebuffer pixel format, 32 or 16
+    """
+    def __init__(self, directory, bits_per_pixel=32):
+        self.directory = directory
+        self.pixel_ring = install_stubs(join(directory, 'mycroft.conf'))
+        self.fb = load_skill_module('framebuffer')
+        self.volume = load_skill_module('volume')
+        self.backlight = load_skill_module('backlight')
+
+        # Framebuffer
+        self.fb_sysfs = join(directory, 'graphics', 'fb0')
+        self.fb_dev = join(directory, 'fb0')
+        width, height = self.fb.SCREEN
+        os.makedirs(self.fb_sysfs)
+        for name, value in (('virtual_size', '{},{}'.format(width, height)),
+                            ('bits_per_pixel', str(bits_per_pixel)),
+                            ('stride', str(width * bits_per_pixel // 8))):
+            _write(join(self.fb_sysfs, name), value + '\n')
+        open(self.fb_dev, 'wb').close()
+
+        # Backlight
+        self.backlight_sysfs = join(directory, 'backlight')
+        device = join(self.backlight_sysfs, 'rpi_backlight')
+        os.makedirs(device)
+        _write(join(device, 'max_brightness'), '255\n')
+        _write(join(device, 'brightness'), '255\n')
+        self.brightness_file = join(device, 'brightness')
+
+        # Executables, each recording one line per command
+        self.bin = join(directory, 'bin')
+        os.makedirs(self.bin)
+        self.amp_register = join(directory, 'amp')
+        self.i2c_log = join(directory, 'i2c.log')
+        self.pacmd_log = join(directory, 'pacmd.log')
+        _write(self.amp_register, '0\n')
+        executable = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+        scripts = {
+            'i2cset': 'echo "$4" > {0}\necho "$4" >> {1}\n'.format(
+                self.amp_register, self.i2c_log),
+            'i2cget': 'printf "0x%02x\\n" "$(cat {})"\n'.format(
+                self.amp_register),
+            'pacmd': 'exec cat >> {}\n'.format(self.pacmd_log),
+            'pacat': 'exec cat > /dev/null\n'
+        }
+        for name, body in scripts.items():
+            _write(join(self.bin, name), '#!/bin/sh\n' + body, executable)
+        # pacmd and pacat are run from the PATH
+        os.environ['PATH'] = self.bin + os.pathsep + os.environ['PATH']
+
+    def open_amp(self):
+        return self.volume.SubprocessAmp(i2cset=join(self.bin, 'i2cset'),
+                                         i2cget=join(self.bin, 'i2cget'))
+
+    def load_skill(self, bus=None, settings=None):
+        """ Create and initialize the skill on the fake hardware.
+
+            Arguments:
+                bus (FakeBus): bus to connect the skill to
+                settings (dict): skill settings before initialize()
+
+            Returns:
+                (Mark2): the initialized skill
+        """
+        skill_module = load_skill_module('__init__')
+        skill_module.open_amp = self.open_amp
+        skill_module.open_framebuffer = partial(
+            self.fb.open_framebuffer, self.fb_dev, self.fb_sysfs)
+        skill_module.open_backlight = partial(
+            self.backlight.open_backlight, self.backlight_sysfs)
+        skill = skill_module.create_skill()
+        skill.bus = bus or FakeBus()
+        skill.settings.update(settings or {})
+        skill.initialize()
+        return skill
+
+    def writes(self):
+        """ Commands received by the fake devices so far. """
+        def lines(path):
+            try:
+                with open(path) as f:
+                    return sum(1 for _ in f)
+            except FileNotFoundError:
+                return 0
+        return {'i2cset': lines(self.i2c_log),
+                'pacmd': lines(self.pacmd_log),
+                'pixel_ring': sum(self.pixel_ring.counts.values())}
+
+    def state(self):
+        """ Amplifier register and backlight brightness on the devices. """
+        with open(self.amp_register) as f:
+            register = int(f.read())
+        with open(self.brightness_file) as f:
+            brightness = int(f.read())
+        return {'amp_register': register, 'brightness': brightness}
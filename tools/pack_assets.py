@@ -0,0 +1,81 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Convert raw .fb screens to packed .fbz screens.
+
+    Every packed file is read back and compared byte for byte with its
+    source before the source is (optionally) removed.
+
+        python3 -m tools.pack_assets [--remove] [FILE.fb ...]
+"""
+import argparse
+import glob
+import os
+import sys
+from os.path import getsize, join, splitext
+
+from . import SKILL_DIR, load_skill_module
+
+assets = load_skill_module('assets')
+
+
+def pack_file(path, remove=False):
+    """ Pack one raw screen and verify the round trip.
+
+        Returns:
+            (int): size of the packed file
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    packed = assets.pack_frame(raw)
+    target = splitext(path)[0] + assets.PACKED_EXT
+    with open(target, 'wb') as f:
+        f.write(packed)
+
+    with open(target, 'rb') as f:
+        packed = f.read()
+    streamed = b''.join(rows for _, rows in assets.iter_rows(packed))
+    if assets.unpack_frame(packed) != raw or streamed != raw:
+        os.remove(target)
+        raise assets.AssetError('Round trip of {} failed'.format(path))
+    if remove:
+        os.remove(path)
+    return len(packed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('files', nargs='*',
+                        help='raw screens (default: ui/*.fb)')
+    parser.add_argument('--remove', action='store_true',
+                        help='remove raw screens once verified')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(join(SKILL_DIR, 'ui', '*.fb')))
+    total_raw = total_packed = 0
+    for path in files:
+        raw_size = getsize(path)
+        try:
+            packed_size = pack_file(path, args.remove)
+        except assets.AssetError as e:
+            print('FAILED {}'.format(e))
+            sys.exit(1)
+        total_raw += raw_size
+        total_packed += packed_size
+        print('{:40} {:>9} -> {:>7} bytes, round trip ok'.format(
+            path, raw_size, packed_size))
+    print('total {} -> {} bytes'.format(total_raw, total_packed))
+
+
+if __name__ == '__main__':
+    main()
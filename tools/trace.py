@@ -0,0 +1,400 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Record messagebus traffic and replay it against the skill.
+
+    A trace is a gzipped file of JSON lines. The first line is a header,
+    each following line one message: [seconds since start, type, data].
+
+    record connects to the messagebus of a device (needs websocket-client,
+    installed with mycroft-core) and stores the messages the skill
+    handles. synth writes a trace of made up interactions. replay feeds a
+    trace to the skill running on fake hardware (see tools.fakes) and
+    reports handler latency, queueing delay, device writes and the final
+    state of the LEDs, screen and volume.
+
+        python3 -m tools.trace record OUT.trace.gz [--url URL] [--seconds N]
+        python3 -m tools.trace synth OUT.trace.gz [--interactions N]
+        python3 -m tools.trace replay TRACE.gz [--speed X] [--json OUT]
+"""
+import argparse
+import gzip
+import json
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from os.path import join
+
+from .bench import summarize
+from .fakes import FakeBus, FakeDevice, Message
+
+FORMAT = 'mark2-trace'
+VERSION = 1
+BUS_URL = 'ws://127.0.0.1:8181/core'
+# Messages the skill handles, the rest of the bus traffic isn't recorded
+TRACED_TYPES = (
+    'mycroft.ready', 'mycroft.paired', 'mycroft.internet.connected',
+    'mycroft.skill.handler.start', 'mycroft.skill.handler.complete',
+    'mycroft.speech.recognition.unknown',
+    'mycroft.volume.set', 'mycroft.volume.get', 'mycroft.volume.duck',
+    'mycroft.volume.unduck',
+    'recognizer_loop:wakeword', 'recognizer_loop:record_end',
+    'recognizer_loop:audio_output_start', 'recognizer_loop:audio_output_end',
+    'enclosure.mouth.text',
+    'system.wifi.ap_up', 'system.wifi.ap_device_connected',
+    'system.wifi.ap_device_disconnected',
+    'mark2.perf.get'
+)
+SCREENS = ('mycroft', '0-wifi-connect', '1-wifi-follow-prompt',
+           '2-wifi-choose-network', '3-wifi-success', '4-pairing-home',
+           '5-pairing-success', '6-intro')
+SETTLE_TIMEOUT = 5
+
+
+class TraceWriter:
+    """ Writes messages to a trace file.
+
+        Arguments:
+            path (str): trace file to create
+            source (str): where the messages come from, kept in the header
+    """
+    def __init__(self, path, source=''):
+        self.file = gzip.open(path, 'wt')
+        self.start = None
+        self.count = 0
+        self._write({'format': FORMAT, 'version': VERSION,
+                     'created': time.time(), 'source': source})
+
+    def _write(self, obj):
+        self.file.write(json.dumps(obj, separators=(',', ':')) + '\n')
+
+    def add(self, msg_type, data, at=None):
+        """ Append a message received at monotonic time at (now). """
+        at = time.monotonic() if at is None else at
+        if self.start is None:
+            self.start = at
+        self._write([round(at - self.start, 4), msg_type, data or {}])
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """ Load a trace.
+
+        Returns:
+            (list): (seconds, type, data) per message, in order
+    """
+    with gzip.open(path, 'rt') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise ValueError('{} is not a version {} trace'.format(
+                path, VERSION))
+        return [tuple(json.loads(line)) for line in f if line.strip()]
+
+
+def record(path, url=BUS_URL, seconds=None, types=TRACED_TYPES):
+    """ Record messages from a messagebus until interrupted. """
+    from websocket import create_connection, WebSocketTimeoutException
+    ws = create_connection(url)
+    writer = TraceWriter(path, url)
+    end = time.monotonic() + seconds if seconds else None
+    try:
+        while end is None or time.monotonic() < end:
+            if end is not None:
+                ws.settimeout(max(end - time.monotonic(), 0.01))
+            try:
+                message = json.loads(ws.recv())
+            except WebSocketTimeoutException:
+                continue
+            if not types or message.get('type') in types:
+                writer.add(message['type'], message.get('data'))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        ws.close()
+    return writer.count
+
+
+def synthesize(path, interactions=100, gap=4.0, seed=0):
+    """ Write a trace of interactions following each other closely.
+
+        Each interaction is a wake word, the recording, a skill handler
+        speaking, sometimes a volume change or text on the screen, with
+        the clock skill updating in the background.
+
+        Returns:
+            (int): number of messages written
+    """
+    rand = random.Random(seed)
+    events = [(0.0, 'mycroft.ready', {})]
+    t = 1.0
+    skills = ('WeatherSkill.handle_current_weather',
+              'JokingSkill.handle_general_joke',
+              'WikipediaSkill.handle_wiki_query',
+              'VolumeSkill.handle_increase_volume')
+    for n in range(interactions):
+        handler = rand.choice(skills)
+        speech = rand.uniform(0.5, 3.0)
+        events += [(t, 'recognizer_loop:wakeword', {'utterance': 'hey'}),
+                   (t + 0.01, 'mycroft.volume.duck', {}),
+                   (t + 1.5, 'recognizer_loop:record_end', {}),
+                   (t + 1.51, 'mycroft.volume.unduck', {}),
+                   (t + 1.8, 'mycroft.skill.handler.start',
+                    {'handler': handler}),
+                   (t + 2.0, 'recognizer_loop:audio_output_start', {}),
+                   (t + 2.0 + speech, 'recognizer_loop:audio_output_end',
+                    {}),
+                   (t + 2.05 + speech, 'mycroft.skill.handler.complete',
+                    {'handler': handler})]
+        if handler.startswith('VolumeSkill'):
+            percent = rand.uniform(0.1, 1.0)
+            for step in range(5):  # A slider moving
+                events.append((t + 1.9 + step * 0.02, 'mycroft.volume.set',
+                               {'percent': round(percent + step * 0.01, 3)}))
+            events.append((t + 1.99, 'mycroft.volume.get', {'show': True}))
+        if rand.random() < 0.3:
+            events.append((t + 1.85, 'enclosure.mouth.text',
+                           {'text': 'Result {}'.format(n)}))
+        if rand.random() < 0.5:
+            clock = 'TimeSkill.update_display'
+            at = t + rand.uniform(0, gap)
+            events += [(at, 'mycroft.skill.handler.start',
+                        {'handler': clock}),
+                       (at + 0.05, 'mycroft.skill.handler.complete',
+                        {'handler': clock})]
+        t += 2.0 + speech + rand.uniform(0.2, gap)
+    writer = TraceWriter(path, 'synthetic, seed {}'.format(seed))
+    for at, msg_type, data in sorted(events, key=lambda e: e[0]):
+        writer.add(msg_type, data, at)
+    writer.close()
+    return writer.count
+
+
+class QueuedBus(FakeBus):
+    """ Bus delivering messages one at a time on a dispatch thread.
+
+        Like the messagebus client, handlers run one after the other on a
+        single thread, so a slow handler delays the messages behind it.
+        Messages emitted by the skill are queued like incoming ones.
+    """
+    def __init__(self):
+        super().__init__()
+        self.latency = defaultdict(list)  # type: handler durations
+        self.delay = defaultdict(list)    # type: arrival to dispatch
+        self.errors = 0
+        self.last = {}  # type: last message dispatched
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name='QueuedBus', daemon=True)
+        self._thread.start()
+
+    def emit(self, message):
+        self.emitted.append(message)
+        self.deliver(message)
+
+    def deliver(self, message):
+        """ Queue a message arriving now. """
+        self._queue.put((message, time.monotonic()))
+
+    def join(self):
+        """ Wait until all queued messages are handled. """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            message, arrived = self._queue.get()
+            start = time.monotonic()
+            self.delay[message.type].append(start - arrived)
+            try:
+                self.dispatch(message)
+            except Exception:
+                self.errors += 1
+            self.latency[message.type].append(time.monotonic() - start)
+            self.last[message.type] = message
+            self._queue.task_done()
+
+
+def screen_shown(device, skill):
+    """ Name of the stored screen on the fake display, or None. """
+    fb = skill.display.fb
+    with open(device.fb_dev, 'rb') as f:
+        shown = f.read(fb.size)
+    # Draw each screen the way the skill would to a second display
+    probe = device.fb.FrameBuffer(join(device.directory, 'probe'), fb.screen,
+                                  fb.bits_per_pixel, fb.stride)
+    open(probe.dev, 'wb').close()
+    try:
+        for name in SCREENS:
+            try:
+                skill.screens.draw(probe, name)
+            except Exception:
+                continue
+            if probe._map[:] == shown:
+                return name
+    finally:
+        probe.close()
+    return None
+
+
+def replay(path, speed=1.0, bits_per_pixel=32):
+    """ Replay a trace against the skill on fake hardware.
+
+        Arguments:
+            path (str): trace file
+            speed (float): time scale, 2 replays twice as fast as
+                           recorded, 0 sends messages without waiting
+            bits_per_pixel (int): framebuffer pixel format
+
+        Returns:
+            (dict): report, see print_report()
+    """
+    messages = read_trace(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        device = FakeDevice(tmp, bits_per_pixel)
+        bus = QueuedBus()
+        skill = device.load_skill(bus)
+        # Show text the way the skill does during pairing
+        skill._start_pairing_text()
+        bus.join()
+        skill.display.wait_idle(SETTLE_TIMEOUT)
+        skill.leds.wait_idle(SETTLE_TIMEOUT)
+        writes_before = device.writes()
+        fb_before = skill.display.fb.bytes_written
+        display_before = skill.display.stats()
+
+        start = time.monotonic()
+        for at, msg_type, data in messages:
+            if speed:
+                delay = start + at / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            bus.deliver(Message(msg_type, data))
+        sent = time.monotonic() - start
+        bus.join()
+        handled = time.monotonic() - start
+
+        # Let the workers finish what the messages started
+        skill.display.wait_idle(SETTLE_TIMEOUT)
+        skill.leds.wait_idle(SETTLE_TIMEOUT)
+        skill.audio.flush()
+        writes = device.writes()
+        display = skill.display.stats()
+        text = bus.last.get('enclosure.mouth.text')
+        report = {
+            'trace': path,
+            'messages': len(messages),
+            'speed': speed,
+            'trace_seconds': messages[-1][0] if messages else 0.0,
+            'send_seconds': sent,
+            'handled_seconds': handled,
+            'throughput': len(messages) / handled if handled else 0.0,
+            'handler_errors': bus.errors,
+            'events': {
+                msg_type: {'count': len(bus.latency[msg_type]),
+                           'handler_ms': summarize(bus.latency[msg_type]),
+                           'queue_ms': summarize(bus.delay[msg_type])}
+                for msg_type in sorted(bus.latency)
+            },
+            'device_writes': dict(
+                {name: count - writes_before[name]
+                 for name, count in writes.items()},
+                fb_bytes=skill.display.fb.bytes_written - fb_before,
+                frames_drawn=display['rendered'] -
+                display_before['rendered'],
+                frames_dropped=display['dropped'] -
+                display_before['dropped']),
+            'final_state': dict(
+                device.state(),
+                leds=list(skill.leds.shown),
+                screen=screen_shown(device, skill),
+                last_text=text.data.get('text') if text else None,
+                volume=skill.volume,
+                muted=skill.muted)
+        }
+        skill.shutdown()
+    return report
+
+
+def print_report(report):
+    print('{messages} messages replayed at {speed}x: trace {trace_seconds:.1f}'
+          ' s, sent in {send_seconds:.2f} s, handled in {handled_seconds:.2f}'
+          ' s ({throughput:.0f} messages/s), {handler_errors} handler '
+          'errors'.format(**report))
+    print('{:36} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'message', 'count', 'p50 ms', 'max ms', 'queue p50', 'queue max'))
+    for msg_type, event in sorted(report['events'].items()):
+        print('{:36} {:6} {:9.3f} {:9.3f} {:9.3f} {:9.3f}'.format(
+            msg_type, event['count'], event['handler_ms']['p50'],
+            event['handler_ms']['max'], event['queue_ms']['p50'],
+            event['queue_ms']['max']))
+    print('device writes: {}'.format(', '.join(
+        '{} {}'.format(k, v)
+        for k, v in sorted(report['device_writes'].items()))))
+    print('final state: {}'.format(', '.join(
+        '{} {}'.format(k, v)
+        for k, v in sorted(report['final_state'].items()))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command')
+    rec = commands.add_parser('record', help='record a device messagebus')
+    rec.add_argument('output')
+    rec.add_argument('--url', default=BUS_URL)
+    rec.add_argument('--seconds', type=float,
+                     help='stop after this long, otherwise on Ctrl-C')
+    rec.add_argument('--all', action='store_true',
+                     help='record every message type')
+    syn = commands.add_parser('synth', help='write a synthetic trace')
+    syn.add_argument('output')
+    syn.add_argument('--interactions', type=int, default=100)
+    syn.add_argument('--gap', type=float, default=4.0,
+                     help='longest pause between interactions in seconds')
+    syn.add_argument('--seed', type=int, default=0)
+    rep = commands.add_parser('replay', help='replay a trace')
+    rep.add_argument('trace')
+    rep.add_argument('--speed', type=float, default=1.0,
+                     help='time scale, 0 sends as fast as possible')
+    rep.add_argument('--bpp', type=int, default=32, choices=(32, 16))
+    rep.add_argument('--json', help='also write the report to a JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        count = record(args.output, args.url, args.seconds,
+                       None if args.all else TRACED_TYPES)
+        print('{} messages recorded to {}'.format(count, args.output))
+    elif args.command == 'synth':
+        count = synthesize(args.output, args.interactions, args.gap,
+                           args.seed)
+        print('{} messages written to {}'.format(count, args.output))
+    elif args.command == 'replay':
+        report = replay(args.trace, args.speed, args.bpp)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        if report['handler_errors']:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
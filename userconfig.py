@@ -0,0 +1,154 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Batched, diff based writes to the user's mycroft configuration. """
+import json
+import os
+import stat
+import tempfile
+import threading
+from os.path import dirname, exists
+
+from mycroft.util.json_helper import load_commented_json
+from mycroft.util.log import LOG
+
+DEBOUNCE_WINDOW = 1.0
+
+
+class ConfigSync:
+    """ Writes keys controlled by the skill to the user configuration.
+
+        Changes are collected for a short window and written together.
+        Keys already having the wanted value are dropped, so the file is
+        only written, and a reload only triggered, when something changes.
+        The file is replaced atomically; readers never see half of it.
+
+        Arguments:
+            path (str): user configuration file
+            emit (callable): called with the list of changed keys after
+                             a write, to announce the change
+            current (callable): returns the configuration in effect, used
+                                for keys the user configuration doesn't set
+            window (float): seconds to collect changes
+    """
+    def __init__(self, path, emit, current=None, window=DEBOUNCE_WINDOW):
+        self.path = path
+        self.emit = emit
+        self.current = current
+        self.window = window
+        self.requests = 0
+        self.writes = 0
+        self.batched = 0    # Changes merged into a write already pending
+        self.redundant = 0  # Batches with nothing to change
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.RLock()
+
+    @property
+    def avoided(self):
+        """ Configuration reloads saved compared to writing every change.
+        """
+        return self.batched + self.redundant
+
+    def set(self, key, value):
+        """ Request a value for a key, written after the window. """
+        with self._lock:
+            self.requests += 1
+            if self._timer is not None:
+                self.batched += 1
+            else:
+                self._timer = threading.Timer(self.window, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            self._pending[key] = value
+
+    def flush(self):
+        """ Write the pending changes now.
+
+            Returns:
+                (list): keys that were changed on disk
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not pending:
+                return []
+            config = self._read()
+            if config is None:
+                return []
+            changed = {key: value for key, value in pending.items()
+                       if not self._in_effect(config, key, value)}
+            if not changed:
+                self.redundant += 1
+                LOG.debug('Configuration already up to date, {} reloads '
+                          'avoided'.format(self.avoided))
+                return []
+            config.update(changed)
+            self._write(config)
+            self.writes += 1
+        keys = sorted(changed)
+        LOG.info('Updated {} in the user configuration, {} reloads '
+                 'avoided'.format(', '.join(keys), self.avoided))
+        self.emit(keys)
+        return keys
+
+    def _on_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            LOG.exception('Could not update the user configuration')
+
+    def _in_effect(self, config, key, value):
+        if key in config:
+            return config[key] == value
+        return (self.current is not None and
+                self.current().get(key) == value)
+
+    def _read(self):
+        """ Load the user configuration, None if it can't be parsed. """
+        if not exists(self.path):
+            return {}
+        try:
+            return load_commented_json(self.path)
+        except Exception as e:
+            # Writing would replace the user's file with only our keys
+            LOG.error('Not updating unreadable {} ({})'.format(self.path, e))
+            return None
+
+    def _write(self, config):
+        directory = dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.mycroft.conf.')
+        try:
+            # mkstemp creates the file private, keep the original mode
+            mode = os.stat(self.path).st_mode if exists(self.path) else 0o644
+            os.chmod(tmp, stat.S_IMODE(mode))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(config, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def stats(self):
+        return {'requests': self.requests, 'writes': self.writes,
+                'batched': self.batched, 'redundant': self.redundant,
+                'avoided': self.avoided}
+
+    def close(self):
+        """ Write any pending change. """
+        self.flush()
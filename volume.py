@@ -0,0 +1,256 @@
+# Copyright 2018 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Access to the stereo amplifier's volume register over I2C. """
+import fcntl
+import os
+import threading
+import time
+from subprocess import call, check_output
+
+from mycroft.util.log import LOG
+
+from .metrics import METRICS
+
+I2C_BUS = 1
+AMP_ADDRESS = 0x4b
+I2C_SLAVE = 0x0703  # ioctl selecting the device address, from i2c-dev.h
+COALESCE_WINDOW = 0.1
+I2CSET = '/usr/sbin/i2cset'
+I2CGET = '/usr/sbin/i2cget'
+
+
+class I2CAmp:
+    """ Amplifier reached through an I2C device handle kept open.
+
+        Arguments:
+            bus (int): I2C bus number
+            address (int): device address on the bus
+    """
+    def __init__(self, bus=I2C_BUS, address=AMP_ADDRESS):
+        self.bus = bus
+        self.address = address
+        self._lock = threading.Lock()
+        self._fd = os.open('/dev/i2c-{}'.format(bus), os.O_RDWR)
+        try:
+            fcntl.ioctl(self._fd, I2C_SLAVE, address)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def write(self, value):
+        """ Send a single byte to the device. """
+        with self._lock:
+            os.write(self._fd, bytes([value]))
+
+    def read(self):
+        """ Receive a single byte from the device. """
+        with self._lock:
+            return os.read(self._fd, 1)[0]
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SubprocessAmp:
+    """ Amplifier reached by running i2cset and i2cget.
+
+        Arguments:
+            bus (int): I2C bus number
+            address (int): device address on the bus
+            i2cset (str): i2cset executable
+            i2cget (str): i2cget executable
+    """
+    def __init__(self, bus=I2C_BUS, address=AMP_ADDRESS, i2cset=I2CSET,
+                 i2cget=I2CGET):
+        self.bus = bus
+        self.address = address
+        self.i2cset = i2cset
+        self.i2cget = i2cget
+
+    def write(self, value):
+        call([self.i2cset,
+              '-y',                   # force a write
+              str(self.bus),          # i2c bus number
+              hex(self.address),      # stereo amp device address
+              str(value)])            # volume level, 0-30
+
+    def read(self):
+        vol = check_output([self.i2cget, '-y', str(self.bus),
+                            hex(self.address)])
+        # Convert the returned hex value from i2cget
+        return int(vol, 16)
+
+    def close(self):
+        pass
+
+
+class FakeAmp:
+    """ Amplifier stand-in keeping the register in memory.
+
+        Arguments:
+            value (int): initial register value
+            latency (float): seconds each access takes, to mimic hardware
+    """
+    def __init__(self, value=0, latency=0.0):
+        self.value = value
+        self.latency = latency
+        self.writes = 0
+        self.reads = 0
+
+    def write(self, value):
+        time.sleep(self.latency)
+        self.value = value
+        self.writes += 1
+
+    def read(self):
+        time.sleep(self.latency)
+        self.reads += 1
+        return self.value
+
+    def close(self):
+        pass
+
+
+def open_amp(bus=I2C_BUS, address=AMP_ADDRESS):
+    """ Open the amplifier, preferring the I2C device over subprocesses. """
+    try:
+        return I2CAmp(bus, address)
+    except OSError as e:
+        LOG.info('Using i2cset/i2cget for volume, '
+                 'I2C device unavailable ({})'.format(e))
+        return SubprocessAmp(bus, address)
+
+
+class AudioState:
+    """ Write-through cache of the amplifier register and sink mute state.
+
+        Writes of the value the hardware already has are skipped. Writes
+        made with coalesce=True are delayed for a short window and only
+        the last value of a burst is written. Any immediate write replaces
+        a delayed one.
+
+        Arguments:
+            amp: amplifier backend (I2CAmp, SubprocessAmp or FakeAmp)
+            pulse (PulseControl): PulseAudio control channel
+            window (float): seconds to collect coalesced writes
+    """
+    def __init__(self, amp, pulse, window=COALESCE_WINDOW):
+        self.amp = amp
+        self.pulse = pulse
+        self.window = window
+        self.register = None  # Last value confirmed written, None: unknown
+        self.sink_muted = None
+        self.writes = 0
+        self.suppressed = 0
+        self.coalesced = 0
+        self._pending = None
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def set_register(self, value, coalesce=False):
+        """ Set the amplifier volume register.
+
+            Arguments:
+                value (int): register value
+                coalesce (bool): wait for more values before writing
+        """
+        with self._lock:
+            if coalesce:
+                if self._timer is not None:
+                    self.coalesced += 1
+                else:
+                    self._timer = threading.Timer(self.window,
+                                                  self._on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                self._pending = value
+            else:
+                self._cancel_pending()
+                self._write_register(value)
+
+    def flush(self):
+        """ Write a coalesced value now. """
+        with self._lock:
+            value, self._pending = self._pending, None
+            self._cancel_pending()
+            if value is not None:
+                self._write_register(value)
+
+    def _on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            LOG.error('Couldn\'t set volume. ({})'.format(e))
+
+    def _cancel_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is not None:
+            self.coalesced += 1
+            self._pending = None
+
+    def _write_register(self, value):
+        if value == self.register:
+            self.suppressed += 1
+            return
+        self.register = None  # Unknown until the write succeeds
+        with METRICS.timer('i2c.write'):
+            self.amp.write(value)
+        self.register = value
+        self.writes += 1
+
+    def set_sink_mute(self, mute):
+        """ Mute or unmute the PulseAudio sink.
+
+            The state is only recorded once the command was delivered,
+            otherwise it stays unknown and the next change is sent.
+        """
+        with self._lock:
+            if mute == self.sink_muted:
+                self.suppressed += 1
+                return
+            self.sink_muted = None  # Unknown until delivered
+            if self.pulse.set_sink_mute(0, mute):
+                self.sink_muted = mute
+                self.writes += 1
+
+    def sync(self):
+        """ Read the register back from the amplifier.
+
+            The sink mute state can't be read back, it is forgotten so the
+            next mute or unmute is always sent.
+
+            Returns:
+                (int): register value
+        """
+        with self._lock:
+            self.register = None
+            self.sink_muted = None
+            with METRICS.timer('i2c.read'):
+                self.register = self.amp.read()
+            return self.register
+
+    def stats(self):
+        return {'writes': self.writes, 'suppressed': self.suppressed,
+                'coalesced': self.coalesced}
+
+    def close(self):
+        """ Drop any delayed write and close the backends. """
+        with self._lock:
+            self._cancel_pending()
+            self.amp.close()
+            self.pulse.close()